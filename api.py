@@ -1,31 +1,386 @@
-from flask import Flask, make_response, jsonify, request, abort
-from flask_mysqldb import MySQL
-from werkzeug.exceptions import BadRequest
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask import Flask, Response, make_response, jsonify, request, abort, stream_with_context, url_for
+from werkzeug.exceptions import BadRequest, UnsupportedMediaType
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt, verify_jwt_in_request
 from marshmallow import Schema, fields, ValidationError
+from datetime import date, datetime, timedelta
+from functools import wraps
+import csv
+import io
+import json
+import os
+import time
+
+from cache import NOT_FOUND, IdentityCache, RowCache
+from cli import create_cli
+from compression import Compressor
+from fragments import RowFragments
+from ingest import batched, request_rows
+from json_provider import RowJSONProvider
+from listing import ListQuery
+from passwords import HasherBusy, PasswordHasher, is_hash
+from rate_limit import RateLimiter
+from reference import ReferenceData
+from storage import create_storage
+from versions import TableVersions
 
 app = Flask(__name__)
+app.json = RowJSONProvider(app)
+# sqlite:///CustomerManagementSystem.db runs on the bundled SQLite file instead of MySQL.
+app.config["DATABASE_URL"] = os.environ.get("DATABASE_URL", "")
 app.config["MYSQL_HOST"] = "127.0.0.1"
 app.config["MYSQL_USER"] = "root"
 app.config["MYSQL_PASSWORD"] = "root"
 app.config["MYSQL_DB"] = "CustomerManagementSystem"
 app.config["MYSQL_CURSORCLASS"] = "DictCursor"
+app.config["MYSQL_POOL_MIN_SIZE"] = 2
+app.config["MYSQL_POOL_MAX_SIZE"] = 10
+app.config["MYSQL_POOL_TIMEOUT"] = 5.0
+app.config["MYSQL_POOL_IDLE_TIMEOUT"] = 300.0
+app.config["STREAM_CHUNK_SIZE"] = 1000
+app.config["PAGE_SIZE_DEFAULT"] = 100
+app.config["PAGE_SIZE_MAX"] = 1000
+app.config["FILTER_ALLOW_UNINDEXED"] = False
+# Rows per multi-row statement (and per commit) in bulk writes
+app.config["BULK_BATCH_SIZE"] = 500
+# Streamed inserts (internal messages, monthly reports): rows per batch and
+# commit, bytes read from the body at a time, and the largest row accepted.
+app.config["INGEST_BATCH_SIZE"] = 1000
+app.config["INGEST_READ_SIZE"] = 64 * 1024
+app.config["INGEST_MAX_ROW_SIZE"] = 1024 * 1024
 app.config["JWT_SECRET_KEY"] = "Drew's_secret_key123"
+# Tokens carry the user's role, so a role change takes effect at the latest when the token expires.
+app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(minutes=15)
+# Login lookups are cached per process; a change made through another
+# process is picked up once the entry expires.
+app.config["IDENTITY_CACHE_SIZE"] = 10000
+app.config["IDENTITY_CACHE_TTL"] = 60.0
+# Single-row GETs (/people/<id>, /payments/<id>, ...) are cached per process
+# too; writes through this process drop their rows, and a "not found" is
+# remembered until the table is next written or for ROW_CACHE_NEGATIVE_TTL.
+app.config["ROW_CACHE_SIZE"] = 10000
+app.config["ROW_CACHE_TTL"] = 60.0
+app.config["ROW_CACHE_NEGATIVE_TTL"] = 10.0
+# PBKDF2 cost factor; stored hashes with another count are replaced on login.
+app.config["PASSWORD_HASH_ITERATIONS"] = 600000
+app.config["PASSWORD_HASH_WORKERS"] = os.cpu_count()
+app.config["PASSWORD_HASH_QUEUE_SIZE"] = 32
+# Response compression: zlib level for gzip/deflate (1 fastest .. 9 smallest),
+# and the smallest buffered body worth compressing. Streams are always compressed.
+# Level 1 gets most of the size reduction for a third of level 6's CPU
+# (benchmarks/bench_compression.py).
+app.config["COMPRESS_LEVEL"] = 1
+app.config["COMPRESS_MIN_SIZE"] = 1024
 jwt = JWTManager(app)
 
-mysql = MySQL(app)
+db = create_storage(app)
+identity_cache = IdentityCache(app.config["IDENTITY_CACHE_SIZE"], app.config["IDENTITY_CACHE_TTL"])
+row_cache = RowCache(app.config["ROW_CACHE_SIZE"], app.config["ROW_CACHE_TTL"], app.config["ROW_CACHE_NEGATIVE_TTL"])
+limiter = RateLimiter(app)
+compressor = Compressor(app)
+table_versions = TableVersions(app)
+# Permission levels (and countries and roles on SQLite) served from memory
+reference_data = ReferenceData(lambda: db, table_versions)
+# Serialized rows of payments, internal messages and monthly reports, reused by list pages
+row_fragments = RowFragments(lambda: db, table_versions, app)
+# flask --app api cms import|export
+app.cli.add_command(create_cli(lambda: db))
+hasher = PasswordHasher(
+    iterations=app.config["PASSWORD_HASH_ITERATIONS"],
+    workers=app.config["PASSWORD_HASH_WORKERS"],
+    queue_size=app.config["PASSWORD_HASH_QUEUE_SIZE"],
+)
 
 @app.route("/")
 def hello_world():
     return "<p>Hello, World!</p>"
 
-def data_fetch(query):
-    cur = mysql.connection.cursor()
-    cur.execute(query)
+def data_fetch(query, params=None):
+    cur = db.cursor()
+    cur.execute(query, params)
     data = cur.fetchall()
     cur.close()
     return data
 
+def row_response(name, id, not_found):
+    """Single-row GET by primary key, read through row_cache."""
+    key, stamp = (name, id), table_versions.stamp(name)
+    data = row_cache.get_row(key, stamp)
+    if data is None:
+        # Taken before the read: a write committed meanwhile invalidates the key and moves the
+        # table version, and then what was read is not kept.
+        generation, (_, changed_at) = row_cache.generation(), table_versions.get(name)
+        # A replica may not have the latest change yet; do not keep what it returns.
+        cacheable = time.time() - changed_at >= db.max_read_lag()
+        cur = db.execute(f"{name}.by_id", (id,))
+        row = cur.fetchone()
+        cur.close()
+        cacheable = cacheable and table_versions.stamp(name) == stamp
+        if row is None:
+            data = NOT_FOUND
+            if cacheable:
+                row_cache.set_missing(key, stamp, generation)
+        else:
+            data = app.json.encode_rows([row])[0].encode()
+            if cacheable:
+                row_cache.set_row(key, data, generation)
+    if data is NOT_FOUND:
+        return make_response(jsonify({"error": not_found}), 404)
+    return app.response_class(data + b"\n", mimetype=app.json.mimetype)
+
+def list_query(name):
+    return ListQuery.from_args(
+        db.resources[name], request.args,
+        default_limit=app.config["PAGE_SIZE_DEFAULT"],
+        max_limit=app.config["PAGE_SIZE_MAX"],
+        stream=wants_stream(),
+        allow_unindexed=app.config["FILTER_ALLOW_UNINDEXED"],
+    )
+
+def list_response(listing, key=None):
+    """Collection GET: one page, or the whole result streamed, as the request asks."""
+    if wants_stream():
+        return stream_response(stream_fetch(*listing.sql()), key=key)
+    if wants_columnar():
+        cur = db.cursor(tuples=True)
+        cur.execute(*listing.sql())
+        columns = [column[0] for column in cur.description]
+        rows = cur.fetchall()
+        cur.close()
+        return page_response(listing, rows, key=key, columns=columns)
+    if row_fragments.covers(listing):
+        fragments, next_cursor = row_fragments.page(listing)
+        return next_page_links(app.json.fragments_response(fragments, key), next_cursor)
+    return page_response(listing, data_fetch(*listing.sql()), key=key)
+
+def page_response(listing, rows, key=None, columns=None):
+    """List response for one page; the cursor for the next one goes in X-Next-Cursor and Link.
+
+    With ``columns``, ``rows`` are tuples and the page is sent in columnar shape.
+    """
+    rows, next_cursor = listing.paginate(rows, columns)
+    if columns is not None:
+        response = make_response(jsonify(columnar_body(columns, rows)), 200)
+        response.mimetype = COLUMNAR_MIMETYPE
+    else:
+        response = app.json.rows_response(rows, key)
+    return next_page_links(response, next_cursor)
+
+def next_page_links(response, next_cursor):
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        args = request.args.to_dict()
+        args["after"] = next_cursor
+        response.headers["Link"] = f'<{url_for(request.endpoint, **args)}>; rel="next"'
+    return response
+
+# Streaming mode for list endpoints: ?stream=1 (JSON array) or ?stream=ndjson,
+# or an "Accept: application/x-ndjson" header. CSV (?format=csv or
+# "Accept: text/csv") is always streamed.
+def wants_stream():
+    return (request.args.get("stream", "").lower() in ("1", "true", "json", "ndjson")
+            or wants_ndjson() or wants_csv())
+
+def wants_ndjson():
+    if request.args.get("stream", "").lower() == "ndjson":
+        return True
+    best = request.accept_mimetypes.best_match(["application/json", "application/x-ndjson"])
+    return best == "application/x-ndjson"
+
+# Conditional GET: list responses carry a strong ETag made from the table's
+# change version and the request, so an unchanged poll is answered with a
+# 304 before any SQL runs.
+def conditional_get(name):
+    def wrapper(fn):
+        @wraps(fn)
+        def decorated_function(*args, **kwargs):
+            version, changed_at = table_versions.get(name)
+            if time.time() - changed_at < db.max_read_lag():
+                # A replica may not have this change yet; its rows must not get this version's tag.
+                return fn(*args, **kwargs)
+            etag = table_versions.etag(name, version, request.full_path, request.headers.get("Accept", ""))
+            if_none_match = request.if_none_match
+            # Compressed responses carry the ETag with an encoding suffix.
+            for tag in if_none_match.as_set(include_weak=True) or ([etag] if if_none_match.star_tag else []):
+                if tag == etag or tag.startswith(etag + "-"):
+                    response = make_response("", 304)
+                    response.set_etag(tag)
+                    response.vary.add("Accept")
+                    return response
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                response.vary.add("Accept")
+            return response
+        return decorated_function
+    return wrapper
+
+# Write handlers bump their table's version when they return, whether or not
+# they succeeded: a failed batch upload may still have committed earlier batches.
+def bumps_version(name):
+    def wrapper(fn):
+        @wraps(fn)
+        def decorated_function(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                table_versions.bump(name)
+        return decorated_function
+    return wrapper
+
+# Columnar shape (?shape=columnar or "Accept: application/vnd.cms.columnar+json"):
+# {"columns": [...], "rows": [[...], ...]}, read through a tuple cursor so no
+# per-row dicts are built. With &orient=columns a page is sent as one array
+# per column instead, under "data".
+COLUMNAR_MIMETYPE = "application/vnd.cms.columnar+json"
+
+def wants_columnar():
+    if "shape" in request.args:
+        return request.args["shape"].lower() == "columnar"
+    best = request.accept_mimetypes.best_match(["application/json", COLUMNAR_MIMETYPE])
+    return best == COLUMNAR_MIMETYPE
+
+def columnar_body(columns, rows):
+    if request.args.get("orient", "rows").lower() == "columns":
+        return {"columns": columns, "data": [list(values) for values in zip(*rows)] or [[] for _ in columns]}
+    return {"columns": columns, "rows": rows}
+
+def wants_csv():
+    if "format" in request.args:
+        return request.args["format"].lower() == "csv"
+    best = request.accept_mimetypes.best_match(["application/json", "text/csv"])
+    return best == "text/csv"
+
+def csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return value.isoformat()
+    # Decimal keeps its scale ("41.10"), unlike float.
+    return value
+
+def stream_fetch(query, params=None):
+    # The query runs before the response starts, so errors still get a proper status.
+    cur = db.server_side_cursor(tuples=wants_columnar() or wants_csv())
+    cur.execute(query, params)
+    return cur
+
+def stream_response(cur, key=None):
+    """Stream rows from a server-side cursor, fetching STREAM_CHUNK_SIZE at a time."""
+    if wants_csv():
+        return csv_response(cur)
+    ndjson = wants_ndjson()
+    columnar = wants_columnar()
+    if columnar and request.args.get("orient", "rows").lower() == "columns":
+        cur.close()
+        raise BadRequest("orient=columns cannot be streamed; use orient=rows.")
+    chunk_size = app.config["STREAM_CHUNK_SIZE"]
+    dumps = app.json.dumps
+    if columnar:
+        # One array per row; NDJSON sends the column names as the first line.
+        columns = [column[0] for column in cur.description]
+        head = dumps(columns) + "\n" if ndjson else f'{{"columns": {dumps(columns)}, "rows": ['
+        tail = "" if ndjson else "]}"
+    elif ndjson:
+        head = tail = ""
+    else:
+        head = f'{{"{key}": [' if key else "["
+        tail = "]}" if key else "]"
+
+    def generate():
+        finished = False
+        try:
+            yield head
+            first = True
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                if ndjson:
+                    yield app.json.dumps_rows(rows, "\n", cur.description) + "\n"
+                else:
+                    chunk = app.json.dumps_rows(rows, ",", cur.description)
+                    yield chunk if first else "," + chunk
+                    first = False
+            yield tail
+            finished = True
+        finally:
+            if finished:
+                cur.close()
+            else:
+                db.discard_connection()
+
+    mimetype = "application/x-ndjson" if ndjson else COLUMNAR_MIMETYPE if columnar else "application/json"
+    return Response(stream_with_context(generate()), status=200, mimetype=mimetype)
+
+def csv_response(cur):
+    """Stream rows from a server-side cursor as CSV, one header row then STREAM_CHUNK_SIZE rows per chunk."""
+    chunk_size = app.config["STREAM_CHUNK_SIZE"]
+    columns = [column[0] for column in cur.description]
+
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        finished = False
+        try:
+            writer.writerow(columns)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                writer.writerows([csv_value(value) for value in row] for row in rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+            finished = True
+        finally:
+            if finished:
+                cur.close()
+            else:
+                db.discard_connection()
+
+    response = Response(stream_with_context(generate()), status=200, mimetype="text/csv")
+    response.headers["Content-Disposition"] = f'attachment; filename="{request.path.strip("/")}.csv"'
+    return response
+
+@app.errorhandler(HasherBusy)
+def hasher_busy(e):
+    # Backpressure during login storms: ask the client to come back later.
+    response = make_response(jsonify({"error": "Server busy, try again later"}), 503)
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+def ingest_response(statement, to_values, message):
+    """Insert the rows of a streamed request body, INGEST_BATCH_SIZE per batch.
+
+    The body (a JSON array, a single object, or NDJSON, optionally gzipped)
+    is parsed as it is read, so memory holds one batch rather than the whole
+    upload. Each batch is committed on its own; on failure the response
+    says how many rows made it in and which batch failed.
+    """
+    inserted = batches = 0
+    writing = False
+    try:
+        rows = request_rows(request, app.config["INGEST_READ_SIZE"], app.config["INGEST_MAX_ROW_SIZE"])
+        for batch in batched(map(to_values, rows), app.config["INGEST_BATCH_SIZE"]):
+            writing = True
+            db.executemany(statement, batch)
+            db.connection.commit()
+            writing = False
+            inserted += len(batch)
+            batches += 1
+    except UnsupportedMediaType as e:
+        return make_response(jsonify({"error": e.description}), 415)
+    except Exception as e:
+        if writing:
+            db.connection.rollback()
+        return make_response(jsonify({
+            "error": str(e), "inserted": inserted, "batches": batches, "failed_batch": batches,
+        }), 400)
+    return make_response(jsonify({"message": message, "inserted": inserted, "batches": batches}), 201)
+
 # Utility function for input validation
 def validate_actor_data(data):
     if not data.get("first_name") or not data.get("last_name"):
@@ -33,17 +388,25 @@ def validate_actor_data(data):
 
 
 @app.route("/permission_levels", methods=["GET"])
+@conditional_get("permission_levels")
 def get_permission_levels():
     try:
-        data = data_fetch("SELECT * FROM permission_Levels")
-        return make_response(jsonify(data), 200)
+        if not request.args and not (wants_stream() or wants_columnar()):
+            # The plain list, serialized when the snapshot was taken.
+            snapshot = reference_data.get("permission_levels")
+            if len(snapshot.rows) <= app.config["PAGE_SIZE_DEFAULT"]:
+                return app.response_class(snapshot.body, mimetype="application/json")
+        listing = list_query("permission_levels")
+        return list_response(listing)
+    except BadRequest as e:
+        return make_response(jsonify({"error": e.description}), 400)
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 500)
 
 @app.route("/permission_levels", methods=["POST"])
+@bumps_version("permission_levels")
 def add_permission_level():
     try:
-        cur = mysql.connection.cursor()
         data = request.get_json()
 
         # Validate required fields
@@ -51,28 +414,27 @@ def add_permission_level():
             return make_response(jsonify({"error": "Both Permission_Level_Code and Permission_Level_Description are required."}), 400)
 
         # Check if the Permission_Level_Code already exists
-        cur.execute("SELECT * FROM permission_Levels WHERE Permission_Level_Code = %s", (data["Permission_Level_Code"],))
-        if cur.fetchone():
+        if data["Permission_Level_Code"] in reference_data.get("permission_levels").by_key:
             return make_response(jsonify({"error": "Permission_Level_Code already exists."}), 400)
 
         # Insert data into the database
-        query = """
-            INSERT INTO permission_Levels (Permission_Level_Code, Permission_Level_Description)
-            VALUES (%s, %s)
-        """
         values = (data["Permission_Level_Code"], data["Permission_Level_Description"])
-        cur.execute(query, values)
+        db.execute("permission_levels.insert", values, write=True)
 
-        mysql.connection.commit()
+        db.connection.commit()
+        reference_data.add("permission_levels", {
+            "Permission_Level_Code": data["Permission_Level_Code"],
+            "Permission_Level_Description": data["Permission_Level_Description"],
+        })
         return make_response(jsonify({"message": "Permission level(s) added successfully"}), 201)
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 400)
 
 
 @app.route("/permission_levels/<int:id>", methods=["PUT"])
+@bumps_version("permission_levels")
 def update_permission_level(id):
     try:
-        cur = mysql.connection.cursor()
         info = request.get_json()
 
         # Extract and validate data
@@ -81,11 +443,9 @@ def update_permission_level(id):
             return make_response(jsonify({"error": "Permission description is required"}), 400)
 
         # Update database
-        cur.execute(
-            "UPDATE permission_Levels SET Permission_Level_Description = %s WHERE Permission_Level_ID = %s",
-            (permission_description, id),
-        )
-        mysql.connection.commit()
+        cur = db.execute("permission_levels.update", (permission_description, id), write=True)
+        db.connection.commit()
+        reference_data.reload("permission_levels")
 
         if cur.rowcount == 0:
             return make_response(jsonify({"error": "Permission level not found"}), 404)
@@ -95,11 +455,12 @@ def update_permission_level(id):
         return make_response(jsonify({"error": str(e)}), 400)
 
 @app.route("/permission_levels/<int:id>", methods=["DELETE"])
+@bumps_version("permission_levels")
 def delete_permission_level(id):
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("DELETE FROM permission_Levels WHERE Permission_Level_ID = %s", (id,))
-        mysql.connection.commit()
+        cur = db.execute("permission_levels.delete", (id,), write=True)
+        db.connection.commit()
+        reference_data.reload("permission_levels")
 
         if cur.rowcount == 0:
             return make_response(jsonify({"error": "Permission level not found"}), 404)
@@ -110,17 +471,13 @@ def delete_permission_level(id):
 
 
 @app.route("/people", methods=["GET"])
+@conditional_get("people")
 def get_people():
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("""
-            SELECT Person_ID, Permission_Level_Code, Login_Name, 
-                   Password, Personal_Details, Other_Details, Country_Name, 
-                   Role_Description
-            FROM people
-        """)
-        people = cur.fetchall()
-        return make_response(jsonify({"people": people}), 200)
+        listing = list_query("people")
+        return list_response(listing, key="people")
+    except BadRequest as e:
+        return make_response(jsonify({"error": e.description}), 400)
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 400)
 
@@ -136,13 +493,13 @@ class UserSchema(Schema):
     Role_Description = fields.Str(required=True)
 
 @app.route("/people", methods=["POST"])
+@bumps_version("people")
 def add_person():
     try:
         info = request.get_json()
         # Validate incoming request data
         UserSchema().load(info) 
 
-        cur = mysql.connection.cursor()
         # Extract all fields from JSON
         required_fields = [
             "Permission_Level_Code",
@@ -162,36 +519,155 @@ def add_person():
                     400
                 )
 
-        # Insert data into the database
-        cur.execute(
-            """
-            INSERT INTO people (
-                Permission_Level_Code, Login_Name, Password,
-                Personal_Details, Other_Details, Country_Name, Role_Description
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                info["Permission_Level_Code"],
-                info["Login_Name"],
-                info["Password"],
-                info["Personal_Details"],
-                info["Other_Details"],
-                info["Country_Name"],
-                info["Role_Description"]
-            )
-        )
-        mysql.connection.commit()
+        # Foreign keys are checked against the in-memory reference tables.
+        for field, name in reference_data.person_references().items():
+            if info[field] not in reference_data.get(name).by_key:
+                return make_response(jsonify({"error": f"Unknown {field}: {info[field]}"}), 400)
+
+        # Insert data into the database, with the password hashed
+        values = {field: info[field] for field in required_fields}
+        values["Password"] = hasher.hash(values["Password"])
+        db.execute("people.insert", tuple(values.values()), write=True)
+        db.connection.commit()
         return make_response(jsonify({"message": "Person added successfully"}), 201)
     except ValidationError as err:
         return make_response(jsonify({"error": err.messages}), 400)
+    except HasherBusy:
+        raise
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 400)
 
 
+class BulkPersonSchema(UserSchema):
+    Person_ID = fields.Int()
+
+def validate_bulk_rows(rows, schema):
+    """Validate ``rows`` in place; returns marshmallow errors by row index.
+
+    Rows that pass a plain type check are taken as they are; only the rest
+    go through ``schema.load``, which is far slower per row, to get
+    marshmallow's coercions and error messages.
+    """
+    required = {name for name, field in schema.fields.items() if field.required}
+    optional = set(schema.fields) - required
+    strings = {name for name, field in schema.fields.items() if isinstance(field, fields.Str)}
+    errors = {}
+    for index, row in enumerate(rows):
+        if (type(row) is dict and required <= row.keys() and row.keys() - required <= optional
+                and all(type(row[name]) is str for name in strings if name in row)
+                and all(type(row[name]) is int for name in row.keys() - strings)):
+            continue
+        try:
+            rows[index] = schema.load(row)
+        except ValidationError as err:
+            errors[index] = err.messages
+    return errors
+
+def read_bulk_rows():
+    """Rows of a bulk request body: a JSON array, or NDJSON with one object per line."""
+    if request.mimetype == "application/x-ndjson":
+        rows = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), 1):
+            if line.strip():
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    raise BadRequest(f"Line {number} is not valid JSON.")
+        return rows
+    rows = request.get_json()
+    if not isinstance(rows, list):
+        raise BadRequest("Expected a JSON array (or NDJSON) of people.")
+    return rows
+
+@app.route("/people/bulk", methods=["POST"])
+@bumps_version("people")
+def add_people_bulk():
+    """Create or update many people: rows with a Person_ID that exists are updated.
+
+    Every row is validated before anything is written. Rows are then
+    upserted BULK_BATCH_SIZE at a time, one statement and one commit per
+    batch; a batch that fails is rolled back and its rows reported as errors.
+    """
+    try:
+        rows = read_bulk_rows()
+    except BadRequest as e:
+        return make_response(jsonify({"error": e.description}), 400)
+    # ?prehashed=1 stores the Password fields as sent, which must then be
+    # hashes; it lets a Manager import accounts from another system.
+    prehashed = request.args.get("prehashed", "").lower() in ("1", "true")
+    if prehashed and not has_role("Manager Role"):
+        return make_response(jsonify({"error": "prehashed=1 needs the Manager Role"}), 403)
+    errors = validate_bulk_rows(rows, BulkPersonSchema())
+    # Same checks as POST /people, against the in-memory reference tables.
+    references = [(field, reference_data.get(name).by_key)
+                  for field, name in reference_data.person_references().items()]
+    for index, row in enumerate(rows):
+        if index in errors:
+            continue
+        row_errors = {field: [f"Unknown {field}: {row[field]}"] for field, keys in references if row[field] not in keys}
+        if prehashed and not is_hash(row["Password"]):
+            row_errors["Password"] = ["Not a password hash."]
+        if row_errors:
+            errors[index] = row_errors
+    if errors:
+        return make_response(jsonify({
+            "error": "Validation failed; nothing was written.",
+            "errors": [{"index": index, "error": error} for index, error in sorted(errors.items())],
+        }), 400)
+
+    resource = db.resources["people"]
+    # Hash up front so a busy hasher fails the request before any write.
+    passwords = [row["Password"] for row in rows]
+    if not prehashed:
+        passwords = hasher.hash_many(passwords)
+
+    batch_size = app.config["BULK_BATCH_SIZE"]
+    results = []
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        ids = [row["Person_ID"] for row in batch if "Person_ID" in row]
+        values = []
+        for index, row in enumerate(batch, start):
+            row = {**row, "Password": passwords[index]}
+            values.extend(row.get(column) for column in resource.columns)
+        try:
+            existing = set()
+            if ids:
+                cur = db.cursor(write=True)
+                cur.execute(f"SELECT {resource.pk} FROM {resource.table} WHERE {resource.pk} IN "
+                            f"({', '.join(['%s'] * len(ids))})", ids)
+                existing = {row[resource.pk] for row in cur.fetchall()}
+                cur.close()
+            db.execute(db.statements.upsert("people", len(batch)), values, write=True)
+            db.connection.commit()
+        except Exception as e:
+            db.connection.rollback()
+            results.extend({"index": index, "status": "error", "error": str(e)}
+                           for index in range(start, start + len(batch)))
+            continue
+        for index, row in enumerate(batch, start):
+            if row.get("Person_ID") in existing:
+                identity_cache.invalidate_person(row["Person_ID"])
+                row_cache.invalidate(("people", row["Person_ID"]))
+                results.append({"index": index, "status": "updated"})
+            else:
+                results.append({"index": index, "status": "created"})
+
+    counts = {status: sum(result["status"] == status for result in results)
+              for status in ("created", "updated", "error")}
+    return make_response(jsonify({**counts, "results": results}), 200)
+
+@app.route("/people/<int:id>", methods=["GET"])
+def get_person(id):
+    try:
+        return row_response("people", id, "Person not found")
+    except Exception as e:
+        return make_response(jsonify({"error": str(e)}), 500)
+
 @app.route("/people/<int:id>", methods=["PUT"])
+@bumps_version("people")
 def update_person(id):
     try:
-        cur = mysql.connection.cursor()
         info = request.get_json()
 
         # Extract all fields from JSON
@@ -205,42 +681,42 @@ def update_person(id):
             "Role_Description": info.get("Role_Description")
         }
 
-        # Build dynamic update query based on provided fields
-        update_fields = []
-        values = []
-        for key, value in fields.items():
-            if value is not None:
-                update_fields.append(f"{key} = %s")
-                values.append(value)
+        # Only update the provided fields
+        update_fields = {key: value for key, value in fields.items() if value is not None}
 
         if not update_fields:
             return make_response(jsonify({"error": "No fields to update"}), 400)
+        if "Password" in update_fields:
+            update_fields["Password"] = hasher.hash(update_fields["Password"])
+
+        # UPDATE shapes are cached per set of columns
+        statement, values = db.statements.update("people", update_fields)
 
         # Add the ID to the values list
         values.append(id)
 
-        # Create and execute update query
-        query = f"""
-            UPDATE people 
-            SET {", ".join(update_fields)}
-            WHERE Person_ID = %s
-        """
-        cur.execute(query, values)
-        mysql.connection.commit()
+        cur = db.execute(statement, values, write=True)
+        db.connection.commit()
+        identity_cache.invalidate_person(id)
+        row_cache.invalidate(("people", id))
 
         if cur.rowcount == 0:
             return make_response(jsonify({"error": "Person not found"}), 404)
 
         return make_response(jsonify({"message": "Person updated successfully"}), 200)
+    except HasherBusy:
+        raise
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 400)
 
 @app.route("/people/<int:id>", methods=["DELETE"])
+@bumps_version("people")
 def delete_person(id):
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("DELETE FROM people WHERE Person_ID = %s", (id,))
-        mysql.connection.commit()
+        cur = db.execute("people.delete", (id,), write=True)
+        db.connection.commit()
+        identity_cache.invalidate_person(id)
+        row_cache.invalidate(("people", id))
 
         if cur.rowcount == 0:
             return make_response(jsonify({"error": "Person not found"}), 404)
@@ -251,53 +727,39 @@ def delete_person(id):
 
 
 @app.route("/internal_messages", methods=["GET"])
+@conditional_get("internal_messages")
 def get_internal_messages():
     try:
-        data = data_fetch("SELECT * FROM internal_Messages")
-        return make_response(jsonify(data), 200)
+        listing = list_query("internal_messages")
+        return list_response(listing)
+    except BadRequest as e:
+        return make_response(jsonify({"error": e.description}), 400)
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 500)
 
 @app.route("/internal_messages", methods=["POST"])
+@bumps_version("internal_messages")
 def add_internal_message():
-    try:
-        cur = mysql.connection.cursor()
-        data = request.get_json()
+    # One message, a JSON array of them, or NDJSON; streamed in batches.
+    return ingest_response(
+        "internal_messages.insert",
+        lambda msg: (msg["msg_from_person_id"], msg["msg_to_person_id"], msg["date_message_sent"],
+                     msg["message_subject"], msg["message_text"]),
+        "Internal message(s) added successfully",
+    )
 
-        # Debugging output
-        print(f"Received data: {data}")
-
-        # Check if the data is a list (for bulk insertion) or a single object
-        if isinstance(data, list):
-            query = """
-                INSERT INTO internal_Messages (msg_from_person_id, msg_to_person_id, date_message_sent, message_subject, message_text)
-                VALUES (%s, %s, %s, %s, %s)
-            """
-            values = [(msg["msg_from_person_id"], msg["msg_to_person_id"], msg["date_message_sent"], 
-                       msg["message_subject"], msg["message_text"]) 
-                      for msg in data]
-            cur.executemany(query, values)
-        else:
-            query = """
-                INSERT INTO internal_Messages (msg_from_person_id, msg_to_person_id, date_message_sent, message_subject, message_text)
-                VALUES (%s, %s, %s, %s, %s)
-            """
-            values = (data["msg_from_person_id"], data["msg_to_person_id"], data["date_message_sent"], 
-                      data["message_subject"], data["message_text"])
-            cur.execute(query, values)
-
-        mysql.connection.commit()
-        return make_response(jsonify({"message": "Internal message(s) added successfully"}), 201)
-    except Exception as e:
-        # Debugging output
-        print(f"Error: {str(e)}")
-        return make_response(jsonify({"error": str(e)}), 400)
 
+@app.route("/internal_messages/<int:id>", methods=["GET"])
+def get_internal_message(id):
+    try:
+        return row_response("internal_messages", id, "Internal message not found")
+    except Exception as e:
+        return make_response(jsonify({"error": str(e)}), 500)
 
 @app.route("/internal_messages/<int:id>", methods=["PUT"])
+@bumps_version("internal_messages")
 def update_internal_message(id):
     try:
-        cur = mysql.connection.cursor()
         info = request.get_json()
 
         # Extract and validate data
@@ -310,11 +772,14 @@ def update_internal_message(id):
             return make_response(jsonify({"error": "Message content, sender, recipient, and date sent are required"}), 400)
 
         # Update database
-        cur.execute(
-            "UPDATE internal_Messages SET Message_Content = %s, Sender = %s, Recipient = %s, Date_Sent = %s WHERE Message_ID = %s",
+        cur = db.execute(
+            "internal_messages.update",
             (message_content, sender, recipient, date_sent, id),
+            write=True,
         )
-        mysql.connection.commit()
+        db.connection.commit()
+        row_fragments.row_changed("internal_messages", id)
+        row_cache.invalidate(("internal_messages", id))
 
         if cur.rowcount == 0:
             return make_response(jsonify({"error": "Internal message not found"}), 404)
@@ -324,11 +789,13 @@ def update_internal_message(id):
         return make_response(jsonify({"error": str(e)}), 400)
 
 @app.route("/internal_messages/<int:id>", methods=["DELETE"])
+@bumps_version("internal_messages")
 def delete_internal_message(id):
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("DELETE FROM internal_Messages WHERE Message_ID = %s", (id,))
-        mysql.connection.commit()
+        cur = db.execute("internal_messages.delete", (id,), write=True)
+        db.connection.commit()
+        row_fragments.row_changed("internal_messages", id)
+        row_cache.invalidate(("internal_messages", id))
 
         if cur.rowcount == 0:
             return make_response(jsonify({"error": "Internal message not found"}), 404)
@@ -339,9 +806,9 @@ def delete_internal_message(id):
 
         
 @app.route("/payments", methods=["POST"])
+@bumps_version("payments")
 def add_payment():
     try:
-        cur = mysql.connection.cursor()
         info = request.get_json()
 
         # Extract and validate data
@@ -353,20 +820,24 @@ def add_payment():
             return make_response(jsonify({"error": "Amount, payment date, and payment method are required"}), 400)
 
         # Insert into database
-        cur.execute(
-            "INSERT INTO payments (Amount, Payment_Date, Payment_Method) VALUES (%s, %s, %s)",
-            (amount, payment_date, payment_method),
-        )
-        mysql.connection.commit()
+        db.execute("payments.insert", (amount, payment_date, payment_method), write=True)
+        db.connection.commit()
 
         return make_response(jsonify({"message": "Payment added successfully"}), 201)
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 400)
 
+@app.route("/payments/<int:id>", methods=["GET"])
+def get_payment(id):
+    try:
+        return row_response("payments", id, "Payment not found")
+    except Exception as e:
+        return make_response(jsonify({"error": str(e)}), 500)
+
 @app.route("/payments/<int:id>", methods=["PUT"])
+@bumps_version("payments")
 def update_payment(id):
     try:
-        cur = mysql.connection.cursor()
         info = request.get_json()
 
         # Extract and validate data
@@ -378,11 +849,10 @@ def update_payment(id):
             return make_response(jsonify({"error": "Amount, payment date, and payment method are required"}), 400)
 
         # Update database
-        cur.execute(
-            "UPDATE payments SET Amount = %s, Payment_Date = %s, Payment_Method = %s WHERE Payment_ID = %s",
-            (amount, payment_date, payment_method, id),
-        )
-        mysql.connection.commit()
+        cur = db.execute("payments.update", (amount, payment_date, payment_method, id), write=True)
+        db.connection.commit()
+        row_fragments.row_changed("payments", id)
+        row_cache.invalidate(("payments", id))
 
         if cur.rowcount == 0:
             return make_response(jsonify({"error": "Payment not found"}), 404)
@@ -392,11 +862,13 @@ def update_payment(id):
         return make_response(jsonify({"error": str(e)}), 400)
 
 @app.route("/payments/<int:id>", methods=["DELETE"])
+@bumps_version("payments")
 def delete_payment(id):
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("DELETE FROM payments WHERE Payment_ID = %s", (id,))
-        mysql.connection.commit()
+        cur = db.execute("payments.delete", (id,), write=True)
+        db.connection.commit()
+        row_fragments.row_changed("payments", id)
+        row_cache.invalidate(("payments", id))
 
         if cur.rowcount == 0:
             return make_response(jsonify({"error": "Payment not found"}), 404)
@@ -406,54 +878,49 @@ def delete_payment(id):
         return make_response(jsonify({"error": str(e)}), 400)
 
 @app.route("/payments", methods=["GET"])
+@conditional_get("payments")
 def get_payments():
     try:
-        data = data_fetch("SELECT * FROM payments")
-        return make_response(jsonify(data), 200)
+        listing = list_query("payments")
+        return list_response(listing)
+    except BadRequest as e:
+        return make_response(jsonify({"error": e.description}), 400)
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 500)
 
 @app.route("/monthly_reports", methods=["GET"])
+@conditional_get("monthly_reports")
 def get_monthly_reports():
     try:
-        data = data_fetch("SELECT * FROM monthly_Reports")
-        return make_response(jsonify(data), 200)
+        listing = list_query("monthly_reports")
+        return list_response(listing)
+    except BadRequest as e:
+        return make_response(jsonify({"error": e.description}), 400)
     except Exception as e:
         return make_response(jsonify({"error": str(e)}), 500)
     
 @app.route("/monthly_reports", methods=["POST"])
+@bumps_version("monthly_reports")
 def add_monthly_report():
-    try:
-        cur = mysql.connection.cursor()
-        data = request.get_json()
+    # One report, a JSON array of them, or NDJSON; streamed in batches.
+    return ingest_response(
+        "monthly_reports.insert",
+        lambda report: (report["Person_ID"], report["Date_Report_Sent"], report["Report_Text"]),
+        "Monthly report(s) added successfully",
+    )
 
-        # Check if the data is a list (for bulk insertion) or a single object
-        if isinstance(data, list):
-            query = """
-                INSERT INTO monthly_Reports (Person_ID, Date_Report_Sent, Report_Text)
-                VALUES (%s, %s, %s)
-            """
-            values = [(report["Person_ID"], report["Date_Report_Sent"], report["Report_Text"]) 
-                      for report in data]
-            cur.executemany(query, values)
-        else:
-            query = """
-                INSERT INTO monthly_Reports (Person_ID, Date_Report_Sent, Report_Text)
-                VALUES (%s, %s, %s)
-            """
-            values = (data["Person_ID"], data["Date_Report_Sent"], data["Report_Text"])
-            cur.execute(query, values)
-
-        mysql.connection.commit()
-        return make_response(jsonify({"message": "Monthly report(s) added successfully"}), 201)
-    except Exception as e:
-        return make_response(jsonify({"error": str(e)}), 400)
 
+@app.route("/monthly_reports/<int:id>", methods=["GET"])
+def get_monthly_report(id):
+    try:
+        return row_response("monthly_reports", id, "Monthly report not found")
+    except Exception as e:
+        return make_response(jsonify({"error": str(e)}), 500)
 
 @app.route("/monthly_reports/<int:id>", methods=["PUT"])
+@bumps_version("monthly_reports")
 def update_monthly_report(id):
     try:
-        cur = mysql.connection.cursor()
         info = request.get_json()
 
         # Extract and validate data
@@ -465,11 +932,10 @@ def update_monthly_report(id):
             return make_response(jsonify({"error": "Report title, report date, and report content are required"}), 400)
 
         # Update database
-        cur.execute(
-            "UPDATE monthly_Reports SET Report_Title = %s, Report_Date = %s, Report_Content = %s WHERE Report_ID = %s",
-            (report_title, report_date, report_content, id),
-        )
-        mysql.connection.commit()
+        cur = db.execute("monthly_reports.update", (report_title, report_date, report_content, id), write=True)
+        db.connection.commit()
+        row_fragments.row_changed("monthly_reports", id)
+        row_cache.invalidate(("monthly_reports", id))
 
         if cur.rowcount == 0:
             return make_response(jsonify({"error": "Monthly report not found"}), 404)
@@ -479,11 +945,13 @@ def update_monthly_report(id):
         return make_response(jsonify({"error": str(e)}), 400)
 
 @app.route("/monthly_reports/<int:id>", methods=["DELETE"])
+@bumps_version("monthly_reports")
 def delete_monthly_report(id):
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("DELETE FROM monthly_Reports WHERE Report_ID = %s", (id,))
-        mysql.connection.commit()
+        cur = db.execute("monthly_reports.delete", (id,), write=True)
+        db.connection.commit()
+        row_fragments.row_changed("monthly_reports", id)
+        row_cache.invalidate(("monthly_reports", id))
 
         if cur.rowcount == 0:
             return make_response(jsonify({"error": "Monthly report not found"}), 404)
@@ -501,45 +969,64 @@ def not_found(error):
 def login_user():
     data = request.get_json()
     # Check for missing fields
-    if not data or 'username' not in data or 'password' not in data:
+    if not isinstance(data, dict) or 'username' not in data or 'password' not in data:
         abort(400, description="Missing username or password")
 
     username = data['username']
     password = data['password']
-
-    # Fetch user from the database
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT * FROM people WHERE Login_Name = %s", (username,))
-    user = cur.fetchone()
-    cur.close()
-
-    # Validate user credentials
-    if user is None or user['Password'] != password:  # Assuming user['Password'] is the hashed password
+    # Checked before the identity cache and the hasher, which need strings.
+    if not isinstance(username, str) or not isinstance(password, str):
+        abort(400, description="Username and password must be strings")
+
+    # Fetch user from the identity cache, or the database on a miss
+    user = identity_cache.get(username)
+    if user is None:
+        cur = db.execute("people.identity_by_login", (username,))
+        user = cur.fetchone()
+        cur.close()
+        if user is not None:
+            identity_cache.set(username, user)
+
+    # Validate user credentials; hashing runs on the bounded hasher pool
+    if user is None:
         abort(401, description="Invalid credentials")
-
-    # Create JWT token (identity should be a simple value like username)
-    access_token = create_access_token(identity=username)  # Pass only username as identity
+    ok, new_hash = hasher.verify(password, user["Password"])
+    if not ok:
+        abort(401, description="Invalid credentials")
+    if new_hash is not None:
+        # Stored in plain text or with an old cost factor: keep the new hash.
+        statement, values = db.statements.update("people", {"Password": new_hash})
+        db.execute(statement, values + [user["Person_ID"]], write=True)
+        db.connection.commit()
+        table_versions.bump("people")
+        identity_cache.set(username, {**user, "Password": new_hash})
+        row_cache.invalidate(("people", user["Person_ID"]))
+
+    # Create JWT token; the role and permission level ride along as claims
+    # so protected routes can authorize without a database lookup.
+    access_token = create_access_token(identity=username, additional_claims={
+        "Role_Description": user["Role_Description"],
+        "Permission_Level_Code": user["Permission_Level_Code"],
+    })
     return jsonify(access_token=access_token), 200
 
+def has_role(role):
+    """Whether the request carries a valid token for ``role``; no token is not an error."""
+    verify_jwt_in_request(optional=True)
+    return get_jwt().get("Role_Description") == role
+
 # Role-based access control decorator
 def role_required(role):
     def wrapper(fn):
+        @wraps(fn)
         @jwt_required()
         def decorated_function(*args, **kwargs):
-            current_user = get_jwt_identity()  # This is the username (string)
-            
-            # Fetch the user's role from the database using the username
-            cur = mysql.connection.cursor()
-            cur.execute("SELECT Role_Description FROM people WHERE Login_Name = %s", (current_user,))
-            user = cur.fetchone()
-            cur.close()
-
-            if user:
-                role_description = user.get('Role_Description', None)
-                if role_description != role:
-                    return make_response(jsonify({"error": "Access forbidden: insufficient permissions"}), 403)
-            else:
-                return make_response(jsonify({"error": "User not found"}), 404)
+            claims = get_jwt()
+            if "Role_Description" not in claims:
+                # Issued before roles were put in the token.
+                return make_response(jsonify({"error": "Token has no role; log in again"}), 401)
+            if claims["Role_Description"] != role:
+                return make_response(jsonify({"error": "Access forbidden: insufficient permissions"}), 403)
 
             return fn(*args, **kwargs)
         return decorated_function
@@ -550,22 +1037,39 @@ def role_required(role):
 @app.route("/admin", methods=["GET"])
 @role_required("Manager Role")
 def admin_route():
-    current_user = get_jwt_identity()  # This is the username (string)
-    
-    # Fetch the user's role from the database using the username
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT Role_Description FROM people WHERE Login_Name = %s", (current_user,))
-    user = cur.fetchone()
-    cur.close()
-
-    if user:
-        role_description = user.get('Role_Description', None)
-        if role_description != "Manager Role":
-            return make_response(jsonify({"error": "Access forbidden: insufficient permissions"}), 403)
-    else:
-        return make_response(jsonify({"error": "User not found"}), 404)
-
     return make_response(jsonify({"message": "Welcome to the admin panel!"}), 200)
 
+# Runtime counters for the admin panel
+@app.route("/admin/stats", methods=["GET"])
+@role_required("Manager Role")
+def admin_stats():
+    return make_response(jsonify({
+        "pool": db.stats(),
+        "identity_cache": identity_cache.stats(),
+        "row_cache": row_cache.stats(),
+        "password_hasher": hasher.stats(),
+        "rate_limit": limiter.stats(),
+        "compression": compressor.stats(),
+        "table_versions": table_versions.stats(),
+        "reference_data": reference_data.stats(),
+        "row_fragments": row_fragments.stats(),
+    }), 200)
+
+# Slowest statements by fingerprint: ?limit=N (default 10), ?sort=total_ms|avg_ms|max_ms|calls|rows|p95_ms
+@app.route("/admin/queries", methods=["GET"])
+@role_required("Manager Role")
+def admin_queries():
+    sort = request.args.get("sort", "total_ms")
+    if sort not in db.query_stats.SORT_KEYS:
+        return make_response(jsonify({"error": f"Cannot sort by '{sort}'."}), 400)
+    try:
+        limit = int(request.args.get("limit", 10))
+    except ValueError:
+        return make_response(jsonify({"error": "'limit' must be an integer."}), 400)
+    return make_response(jsonify({"queries": db.query_stats.top(limit, sort)}), 200)
+
 if __name__ == "__main__":
+    db.warm_up()
+    with app.app_context():
+        reference_data.load_all()
     app.run(debug=True)
@@ -0,0 +1,74 @@
+"""Rows/sec of POST /people (one row per request) vs POST /people/bulk.
+
+Runs against a SQLite copy of the bundled database through the Flask test
+client, so HTTP parsing and validation are included but the network is
+not. Both paths hash with a low cost factor, so the comparison is about the
+writes; the bulk path is also run with ``?prehashed=1``, as a Manager.
+
+    python benchmarks/bench_bulk.py --rows 20000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+import api  # noqa: E402
+from passwords import PasswordHasher  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def person(i, password):
+    return {"Permission_Level_Code": "LOW", "Login_Name": f"bench{i}", "Password": password,
+            "Personal_Details": "Benchmark", "Other_Details": "None",
+            "Country_Name": "Canada", "Role_Description": "User"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--single-rows", type=int, default=1000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    shutil.copy(os.path.join(ROOT, "CustomerManagementSystem.db"), path)
+    api.app.config["RATE_LIMIT_ENABLED"] = False
+    hasher = PasswordHasher(iterations=1000)
+    hashed = hasher.hash("benchmark")
+    with patch.object(api, "db", SQLiteStorage(api.app, path=path)), patch.object(api, "hasher", hasher):
+        client = api.app.test_client()
+
+        start = time.perf_counter()
+        for i in range(args.single_rows):
+            assert client.post("/people", json=person(i, "benchmark")).status_code == 201
+        single = args.single_rows / (time.perf_counter() - start)
+
+        rows = [person(i, "benchmark") for i in range(args.single_rows, args.single_rows + args.rows)]
+        start = time.perf_counter()
+        response = client.post("/people/bulk", json=rows)
+        bulk = args.rows / (time.perf_counter() - start)
+        assert response.get_json()["created"] == args.rows
+
+        with api.app.app_context():
+            token = create_access_token(identity="bench", additional_claims={"Role_Description": "Manager Role"})
+        rows = [person(i, hashed) for i in range(args.single_rows + args.rows, args.single_rows + 2 * args.rows)]
+        start = time.perf_counter()
+        response = client.post("/people/bulk?prehashed=1", json=rows, headers={"Authorization": f"Bearer {token}"})
+        prehashed = args.rows / (time.perf_counter() - start)
+        assert response.get_json()["created"] == args.rows
+
+    print(f"single row  {single:10.0f} rows/s")
+    for name, rate in (("bulk", bulk), ("prehashed", prehashed)):
+        print(f"{name:<11} {rate:10.0f} rows/s   ({rate / single:.0f}x, batches of {api.app.config['BULK_BATCH_SIZE']})")
+
+
+if __name__ == "__main__":
+    main()
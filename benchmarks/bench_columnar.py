@@ -0,0 +1,75 @@
+"""Payload size and server CPU of streamed list responses, row dicts vs ?shape=columnar.
+
+Fills a SQLite copy of the bundled database with ``--rows`` internal
+messages and payments (copies of the existing rows), then streams each
+table through the Flask test client as dict rows and as columnar rows.
+CPU is process time, so it covers the cursor, JSON encoding and the
+response iterator but not the network.
+
+    python benchmarks/bench_columnar.py --rows 1000000
+"""
+import argparse
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TABLES = {
+    "/internal_messages": ("Internal_Messages", "Msg_From_Person_ID, Msg_To_Person_ID, Date_Message_Sent, "
+                                                "Message_Subject, Message_Text"),
+    "/payments": ("Payments", "Person_ID, Amount_Due, Reminder_Sent_YN, Date_Reminder_Sent, Date_Paid, Other_Details"),
+}
+
+
+def fill(path, rows):
+    conn = sqlite3.connect(path)
+    for table, columns in TABLES.values():
+        missing = rows - conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        while missing > 0:
+            conn.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {table} LIMIT ?", (missing,))
+            missing = rows - conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    conn.commit()
+    conn.close()
+
+
+def measure(client, url):
+    wall, cpu = time.perf_counter(), time.process_time()
+    size = sum(len(chunk) for chunk in client.get(url).response)
+    return size, time.process_time() - cpu, time.perf_counter() - wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    shutil.copy(os.path.join(ROOT, "CustomerManagementSystem.db"), path)
+    fill(path, args.rows)
+    api.app.config["RATE_LIMIT_ENABLED"] = False
+    # Long streams trip the slow query log on every fetch.
+    logging.getLogger("cms.slow_queries").disabled = True
+    with patch.object(api, "db", SQLiteStorage(api.app, path=path)):
+        client = api.app.test_client()
+        for url in TABLES:
+            dicts = measure(client, f"{url}?stream=1")
+            columnar = measure(client, f"{url}?stream=1&shape=columnar")
+            print(f"{url} ({args.rows} rows)")
+            for name, (size, cpu, wall) in (("dicts", dicts), ("columnar", columnar)):
+                print(f"  {name:<9} {size / 1e6:8.1f} MB  cpu {cpu:6.2f}s  wall {wall:6.2f}s")
+            print(f"  columnar is {1 - columnar[0] / dicts[0]:.0%} smaller and uses {1 - columnar[1] / dicts[1]:.0%} less CPU")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""CPU cost vs bytes on the wire of response compression for /internal_messages.
+
+Fills a SQLite copy of the bundled database with ``--rows`` internal
+messages (random text from the words of the bundled rows), then streams them
+through the Flask test client with each Content-Encoding and level. The
+transfer column is the body size over a ``--mbps`` link, as on the VPN.
+
+    python benchmarks/bench_compression.py --rows 200000 --mbps 20
+"""
+import argparse
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COLUMNS = "Msg_From_Person_ID, Msg_To_Person_ID, Date_Message_Sent, Message_Subject, Message_Text"
+
+
+def sentence(rng, words, count):
+    return " ".join(rng.choice(words) for _ in range(count)).capitalize() + "."
+
+
+def fill(path, rows):
+    """Add messages like populate.py's: random words from the existing text, up to 500 characters."""
+    rng = random.Random(0)
+    conn = sqlite3.connect(path)
+    words = sorted({word.strip(".,").lower() for (text,) in conn.execute("SELECT Message_Text FROM Internal_Messages")
+                    for word in text.split()})
+    missing = rows - conn.execute("SELECT COUNT(*) FROM Internal_Messages").fetchone()[0]
+    conn.executemany(
+        f"INSERT INTO Internal_Messages ({COLUMNS}) VALUES (?, ?, ?, ?, ?)",
+        ((rng.randint(1, 75), rng.randint(1, 75),
+          f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00",
+          sentence(rng, words, 6),
+          " ".join(sentence(rng, words, rng.randint(5, 12)) for _ in range(rng.randint(1, 6)))[:500])
+         for _ in range(missing)),
+    )
+    conn.commit()
+    conn.close()
+
+
+def measure(client, encoding):
+    cpu = time.process_time()
+    response = client.get("/internal_messages?stream=1", headers={"Accept-Encoding": encoding})
+    assert response.headers.get("Content-Encoding", "identity") == encoding
+    size = sum(len(chunk) for chunk in response.response)
+    return size, time.process_time() - cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--mbps", type=float, default=20.0)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    shutil.copy(os.path.join(ROOT, "CustomerManagementSystem.db"), path)
+    fill(path, args.rows)
+    api.app.config["RATE_LIMIT_ENABLED"] = False
+    logging.getLogger("cms.slow_queries").disabled = True
+    runs = [("identity", None), ("gzip", 1), ("gzip", 6), ("gzip", 9), ("deflate", 6)]
+    if "zstd" in api.compressor.algorithms:
+        runs.append(("zstd", None))
+    with patch.object(api, "db", SQLiteStorage(api.app, path=path)):
+        client = api.app.test_client()
+        base_size, base_cpu = measure(client, "identity")
+        print(f"{args.rows} rows, {args.mbps:g} Mbit/s link")
+        print(f"{'encoding':<10} {'MB':>8} {'ratio':>6} {'cpu s':>7} {'extra cpu s':>12} {'transfer s':>11}")
+        for encoding, level in runs:
+            with patch.dict(api.app.config, COMPRESS_LEVEL=level or 6):
+                size, cpu = measure(client, encoding)
+            name = f"{encoding}-{level}" if level else encoding
+            print(f"{name:<10} {size / 1e6:8.1f} {size / base_size:6.2f} {cpu:7.2f} {cpu - base_cpu:12.2f} "
+                  f"{size * 8 / (args.mbps * 1e6):11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Time per page of /payments and /internal_messages with and without the row fragment cache.
+
+Fills a SQLite copy of the bundled database with ``--rows`` rows per table
+(copies of the existing rows), then walks ``--pages`` pages of ``--limit``
+rows through the Flask test client: once with the cache off, once on a
+cold cache and once warm. Reports the cache's hit ratio and memory.
+
+    python benchmarks/bench_fragments.py --rows 100000 --pages 200 --limit 500
+"""
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api  # noqa: E402
+from bench_columnar import ROOT, TABLES, fill  # noqa: E402
+from storage import SQLiteStorage  # noqa: E402
+
+
+def walk(client, url, pages, limit):
+    """Milliseconds per page, following X-Next-Cursor."""
+    start = time.perf_counter()
+    after = ""
+    for _ in range(pages):
+        response = client.get(f"{url}?limit={limit}{after}")
+        after = f"&after={response.headers['X-Next-Cursor']}"
+    return (time.perf_counter() - start) / pages * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=500)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    shutil.copy(os.path.join(ROOT, "CustomerManagementSystem.db"), path)
+    fill(path, args.rows)
+    api.app.config["RATE_LIMIT_ENABLED"] = False
+    logging.getLogger("cms.slow_queries").disabled = True
+    with patch.object(api, "db", SQLiteStorage(api.app, path=path)):
+        client = api.app.test_client()
+        print(f"{args.pages} pages of {args.limit} rows")
+        print(f"{'':<20} {'off ms/page':>12} {'cold ms/page':>13} {'warm ms/page':>13}")
+        for url in TABLES:
+            with patch.dict(api.app.config, ROW_FRAGMENT_TABLES=()):
+                off = walk(client, url, args.pages, args.limit)
+            api.row_fragments.clear()
+            cold = walk(client, url, args.pages, args.limit)
+            warm = walk(client, url, args.pages, args.limit)
+            print(f"{url:<20} {off:12.2f} {cold:13.2f} {warm:13.2f}")
+        stats = api.row_fragments.stats()
+        print(f"hit ratio {stats['hit_ratio']:.2f}, {stats['size']} fragments, {stats['bytes'] / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
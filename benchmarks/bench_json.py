@@ -0,0 +1,82 @@
+"""Serialization cost per row of /payments and /internal_messages pages.
+
+Builds ``--rows`` rows shaped like each endpoint's DictCursor rows (MySQL
+returns Decimal and datetime values, SQLite strings) and encodes them with
+Flask's default provider, as ``jsonify`` did, and with RowJSONProvider.
+
+    python benchmarks/bench_json.py --rows 100000
+"""
+import argparse
+import datetime
+import decimal
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from json_provider import RowJSONProvider, orjson  # noqa: E402
+
+
+def payments(rng, rows, mysql):
+    def value(amount, when):
+        return (decimal.Decimal(amount), when) if mysql else (amount, when.strftime("%Y-%m-%d %H:%M:%S"))
+
+    result = []
+    for i in range(rows):
+        amount, paid = value(f"{rng.randint(1, 99999)}.{rng.randint(0, 99):02d}",
+                             datetime.datetime(2024, rng.randint(1, 12), rng.randint(1, 28), rng.randint(0, 23)))
+        result.append({"Payment_ID": i + 1, "Customer_ID": rng.randint(1, 75), "Payment_Method": "Credit Card",
+                       "Amount_Due": amount, "Date_Paid": paid, "Payment_Details": "Payment for services"})
+    return result
+
+
+def internal_messages(rng, rows, mysql):
+    result = []
+    for i in range(rows):
+        sent = datetime.datetime(2024, rng.randint(1, 12), rng.randint(1, 28), rng.randint(0, 23), rng.randint(0, 59))
+        result.append({"Message_ID": i + 1, "Msg_From_Person_ID": rng.randint(1, 75),
+                       "Msg_To_Person_ID": rng.randint(1, 75),
+                       "Date_Message_Sent": sent if mysql else sent.strftime("%Y-%m-%d %H:%M:%S"),
+                       "Message_Subject": "Meeting follow-up", "Message_Text": "Please see the notes attached. " * 4})
+    return result
+
+
+def timed(encode, rows, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        encode(rows)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(rows) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    default = DefaultJSONProvider(app)
+    rng = random.Random(0)
+    print(f"{args.rows} rows, orjson {'installed' if orjson else 'not installed'}")
+    print(f"{'rows':<28} {'jsonify us/row':>15} {'provider us/row':>16} {'speedup':>8}")
+    with app.app_context():
+        for name, build in (("/payments", payments), ("/internal_messages", internal_messages)):
+            for mysql in (True, False):
+                rows = build(rng, args.rows, mysql)
+                # One provider per dialect: encoders are chosen per shape from the first rows.
+                fast = RowJSONProvider(app)
+                before = timed(default.dumps, rows)
+                after = timed(fast.dumps_rows, rows)
+                label = f"{name} ({'mysql' if mysql else 'sqlite'})"
+                print(f"{label:<28} {before:15.2f} {after:16.2f} {before / after:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Password verification throughput: logins/sec in total and per core.
+
+Verifies one stored hash ``--logins`` times from ``--clients`` threads (the
+request threads) through a PasswordHasher with 1 worker and then with
+``--workers`` workers, at the ``--iterations`` cost factor.
+
+    python benchmarks/bench_login.py
+    python benchmarks/bench_login.py --iterations 1000000 --workers 8
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import HasherBusy, PasswordHasher  # noqa: E402
+
+
+def run(workers, args):
+    hasher = PasswordHasher(iterations=args.iterations, workers=workers, queue_size=args.clients)
+    stored = hasher.hash("correct horse battery staple")
+    busy = 0
+
+    def login(_):
+        nonlocal busy
+        try:
+            hasher.verify("correct horse battery staple", stored)
+        except HasherBusy:
+            busy += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.clients) as clients:
+        list(clients.map(login, range(args.logins)))
+    elapsed = time.perf_counter() - start
+    rate = (args.logins - busy) / elapsed
+    print(f"{workers:>3} worker(s)   {rate:8.1f} logins/s   {rate / workers:8.1f} logins/s per core"
+          f"   {hasher.stats()['time_avg'] * 1000:6.1f} ms/hash   {busy} rejected")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=600000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--logins", type=int, default=200)
+    args = parser.parse_args()
+    print(f"pbkdf2:sha256 with {args.iterations} iterations")
+    for workers in sorted({1, args.workers}):
+        run(workers, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Requests/sec of GET /payments?limit=20 with pooled vs per-request connections.
+
+Permission levels are served from memory now, so the benchmark reads a
+page of payments instead, with the row fragment cache off: every request
+checks out a connection and runs one query. Needs the MySQL server
+configured in api.py. Run from the repository root:
+
+    python benchmarks/bench_pool.py --requests 2000 --threads 8
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import app, db  # noqa: E402
+from db_pool import ConnectionPool, connect_mysql  # noqa: E402
+
+
+class ConnectPerRequest:
+    """What flask_mysqldb did: a fresh connection per app context."""
+
+    def acquire(self):
+        return connect_mysql(app.config)
+
+    def release(self, conn, discard=False):
+        conn.close()
+
+
+def run(label, pool, requests, threads):
+    db.pool = pool
+    client = app.test_client()
+
+    def hit(_):
+        response = client.get("/payments?limit=20")
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    hit(0)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(hit, range(requests)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<20} {requests / elapsed:10.1f} req/s  ({elapsed:.2f}s for {requests} requests)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    app.config["RATE_LIMIT_ENABLED"] = False
+    app.config["ROW_FRAGMENT_TABLES"] = ()
+    run("connect per request", ConnectPerRequest(), args.requests, args.threads)
+
+    pool = ConnectionPool(lambda: connect_mysql(app.config), min_size=args.threads, max_size=args.threads)
+    pool.warm_up()
+    run("pooled", pool, args.requests, args.threads)
+    print("pool stats:", pool.stats())
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Overhead of per-query timing (QueryStats) on the hot read paths.
+
+Runs a primary key lookup and a 100-row page through ``storage.execute``
+``--iterations`` times, with timing switched off and on, against a SQLite
+copy of the bundled database (the fastest backend, so the worst case for
+relative overhead).
+
+    python benchmarks/bench_query_stats.py
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+from storage import SQLiteStorage  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = [
+    ("PK lookup", "payments.by_id", lambda i: (i % 75 + 1,), "fetchone"),
+    ("100-row page", "SELECT * FROM Payments ORDER BY Payment_ID LIMIT 100", lambda i: (), "fetchall"),
+]
+
+
+def run(storage, app, iterations):
+    for label, statement, params, fetch in CASES:
+        timings = {False: float("inf"), True: float("inf")}
+        # Alternate a few rounds and keep the best of each, to even out noise.
+        for enabled in (False, True) * 3:
+            storage.query_stats.enabled = enabled
+            with app.app_context():
+                start = time.perf_counter()
+                for i in range(iterations):
+                    if statement in storage.statements:
+                        cur = storage.execute(statement, params(i))
+                    else:
+                        cur = storage.cursor()
+                        cur.execute(statement, params(i))
+                    getattr(cur, fetch)()
+                    cur.close()
+                elapsed = (time.perf_counter() - start) / iterations * 1e6
+                timings[enabled] = min(timings[enabled], elapsed)
+        print(f"{label:<14} off {timings[False]:8.1f} us/call   on {timings[True]:8.1f} us/call"
+              f"   (+{timings[True] - timings[False]:.1f} us)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    shutil.copy(os.path.join(ROOT, "CustomerManagementSystem.db"), path)
+    storage = SQLiteStorage(app, path=path)
+    run(storage, app, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Parse/bind overhead of ad-hoc SQL vs the compiled statement registry.
+
+Times the login lookup, a primary key lookup and an insert, each run
+``--iterations`` times:
+
+* ``ad hoc``: the SQL text is rebuilt on every call, the way the handlers
+  used to do it, and the driver has to parse it again.
+* ``registry``: the text comes from the StatementRegistry, already in the
+  driver's placeholder style. On SQLite the connection's statement cache
+  reuses the compiled statement; with
+  ``--backend mysql-connector`` each statement is prepared once per
+  connection and later calls only send the parameters (binary protocol).
+
+    python benchmarks/bench_statements.py                        # SQLite copy of the bundled DB
+    python benchmarks/bench_statements.py --backend mysql-connector
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+from storage import MySQLStorage, SQLiteStorage  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def ad_hoc_sql(storage, name):
+    # Rebuilt per call, like the old handlers did.
+    people = storage.resources["people"]
+    sql = {
+        "people.by_login": f"SELECT {people.select_list()} FROM {people.source} WHERE {people.expr('Login_Name')} = %s",
+        "payments.by_id": f"SELECT {storage.resources['payments'].select_list()} FROM payments WHERE Payment_ID = %s",
+        "monthly_reports.insert": """
+            INSERT INTO monthly_Reports (Person_ID, Date_Report_Sent, Report_Text)
+            VALUES (%s, %s, %s)
+        """,
+    }[name]
+    return sql.replace("%s", storage.placeholder)
+
+
+CASES = [
+    ("login lookup", "people.by_login", lambda i: ("nonexistent-user",)),
+    ("PK lookup", "payments.by_id", lambda i: (i % 75 + 1,)),
+    ("insert", "monthly_reports.insert", lambda i: (1, "2024-01-01 00:00:00", "benchmark")),
+]
+
+
+def run(storage, iterations):
+    app = storage.app
+    for label, name, params in CASES:
+        timings = {}
+        for mode in ("ad hoc", "registry"):
+            with app.app_context():
+                start = time.perf_counter()
+                for i in range(iterations):
+                    if mode == "ad hoc":
+                        cur = storage.connection.cursor()
+                        cur.execute(ad_hoc_sql(storage, name), params(i))
+                        if cur.description:
+                            cur.fetchall()
+                    else:
+                        storage.execute(name, params(i), write=True).fetchall()
+                timings[mode] = (time.perf_counter() - start) / iterations * 1e6
+        print(f"{label:<14} ad hoc {timings['ad hoc']:8.1f} us/call   registry {timings['registry']:8.1f} us/call"
+              f"   ({timings['ad hoc'] / timings['registry']:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["sqlite", "mysql-connector"], default="sqlite")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    if args.backend == "sqlite":
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, "bench.db")
+        shutil.copy(os.path.join(ROOT, "CustomerManagementSystem.db"), path)
+        storage = SQLiteStorage(app, path=path)
+    else:
+        from api import app as api_app
+
+        app.config.from_mapping({k: v for k, v in api_app.config.items() if k.startswith("MYSQL_")})
+        app.config["MYSQL_DRIVER"] = "mysql-connector"
+        storage = MySQLStorage(app)
+    storage.app = app
+    run(storage, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
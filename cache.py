@@ -0,0 +1,251 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+NOT_FOUND = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire ``ttl`` seconds after being set.
+
+    Holds at most ``maxsize`` entries; the least recently used one is evicted
+    to make room. Expired entries are dropped when they are next looked up.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, expires_at), least recently used first
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is not _MISSING:
+                value, expires_at = item
+                if expires_at > now:
+                    self._data.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._data[key]
+                self._discarded(key, value)
+                self._expirations += 1
+            self._misses += 1
+            return default
+
+    def get_many(self, keys, default=None):
+        """``[get(key) for key in keys]`` under one lock."""
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key, _MISSING)
+                if item is not _MISSING:
+                    value, expires_at = item
+                    if expires_at > now:
+                        self._data.move_to_end(key)
+                        self._hits += 1
+                        values.append(value)
+                        continue
+                    del self._data[key]
+                    self._discarded(key, value)
+                    self._expirations += 1
+                self._misses += 1
+                values.append(default)
+        return values
+
+    def set(self, key, value, ttl=None):
+        self.set_many([(key, value)], ttl)
+
+    def set_many(self, items, ttl=None):
+        """``set(key, value)`` for each of the ``(key, value)`` pairs, under one lock."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._store(items, expires_at)
+
+    def _store(self, items, expires_at):
+        for key, value in items:
+            if key in self._data:
+                self._discarded(key, self._data[key][0])
+                self._data.move_to_end(key)
+            self._data[key] = (value, expires_at)
+            self._added(key, value)
+        while self._full():
+            old_key, (old_value, _) = self._data.popitem(last=False)
+            self._discarded(old_key, old_value)
+            self._evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._invalidate(key)
+
+    def _invalidate(self, key):
+        item = self._data.pop(key, _MISSING)
+        if item is not _MISSING:
+            self._discarded(key, item[0])
+            self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for key, (value, _) in self._data.items():
+                self._discarded(key, value)
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "size": len(self._data),
+                "max_size": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "invalidations": self._invalidations,
+            }
+
+    def _full(self):
+        return len(self._data) > self.maxsize
+
+    # Hooks for subclasses keeping secondary indexes; called with the lock held.
+    def _added(self, key, value):
+        pass
+
+    def _discarded(self, key, value):
+        pass
+
+
+class IdentityCache(TTLCache):
+    """Login name -> identity row (Person_ID, role, permission level, password hash).
+
+    Writes to ``people`` know the Person_ID rather than the login name, so
+    entries can also be dropped by ``invalidate_person``. MySQL matches
+    login names case- and accent-insensitively, so one person can be cached
+    under several spellings; all of them are dropped.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60.0):
+        super().__init__(maxsize, ttl)
+        self._by_person = {}  # Person_ID -> set of login names it is cached under
+
+    def invalidate_person(self, person_id):
+        with self._lock:
+            for login_name in list(self._by_person.get(person_id, ())):
+                self._invalidate(login_name)
+
+    def _added(self, key, value):
+        self._by_person.setdefault(value["Person_ID"], set()).add(key)
+
+    def _discarded(self, key, value):
+        keys = self._by_person.get(value["Person_ID"])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_person[value["Person_ID"]]
+
+
+class RowCache(TTLCache):
+    """(table, primary key) -> the row's JSON (bytes), for single-row GETs.
+
+    A lookup that found no row is remembered for ``negative_ttl`` seconds,
+    along with the table's version stamp at the time: it only counts while
+    the table is still at that stamp, so an insert ends it early.
+
+    A reader takes ``generation()`` before it reads the row and passes it to
+    ``set_row``/``set_missing``; if the key was invalidated in between, the
+    value may predate the write and is not kept.
+    """
+
+    def __init__(self, maxsize=10000, ttl=60.0, negative_ttl=10.0):
+        super().__init__(maxsize, ttl)
+        self.negative_ttl = negative_ttl
+        self._negative_hits = 0
+        self._generation = 0
+        self._invalidated = OrderedDict()  # key -> generation of its last invalidation, oldest first
+        self._floor = 0  # generation of the newest invalidation no longer in _invalidated
+
+    def get_row(self, key, stamp):
+        """The row's JSON, ``NOT_FOUND`` for a remembered miss, or None when not cached."""
+        value = self.get(key)
+        if value is None or isinstance(value, bytes):
+            return value
+        with self._lock:
+            if value == stamp:
+                self._negative_hits += 1
+                return NOT_FOUND
+            # The table changed since; this was a miss after all.
+            self._hits -= 1
+            self._misses += 1
+            item = self._data.pop(key, _MISSING)
+            if item is not _MISSING:
+                self._discarded(key, item[0])
+        return None
+
+    def generation(self):
+        with self._lock:
+            return self._generation
+
+    def set_row(self, key, value, generation):
+        """Cache the row's JSON unless ``key`` was invalidated after ``generation``."""
+        self._set_unless_invalidated(key, value, generation, None)
+
+    def set_missing(self, key, stamp, generation):
+        self._set_unless_invalidated(key, stamp, generation, self.negative_ttl)
+
+    def _set_unless_invalidated(self, key, value, generation, ttl):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            # Checked and stored under one lock, so an invalidation cannot land in between.
+            if self._invalidated.get(key, self._floor) <= generation:
+                self._store([(key, value)], expires_at)
+
+    def _invalidate(self, key):
+        super()._invalidate(key)
+        self._generation += 1
+        self._invalidated.pop(key, None)
+        self._invalidated[key] = self._generation
+        if len(self._invalidated) > self.maxsize:
+            _, self._floor = self._invalidated.popitem(last=False)
+
+    def stats(self):
+        stats = super().stats()
+        stats["negative_ttl"] = self.negative_ttl
+        stats["negative_hits"] = self._negative_hits
+        return stats
+
+
+class FragmentCache(TTLCache):
+    """Key -> bytes, bounded by the memory the entries take as well as by their count."""
+
+    def __init__(self, maxsize=100000, ttl=3600.0, max_bytes=64 * 1024 * 1024):
+        super().__init__(maxsize, ttl)
+        self.max_bytes = max_bytes
+        self._bytes = 0
+
+    def _full(self):
+        return len(self._data) > self.maxsize or self._bytes > self.max_bytes
+
+    def _added(self, key, value):
+        self._bytes += sys.getsizeof(key) + sys.getsizeof(value)
+
+    def _discarded(self, key, value):
+        self._bytes -= sys.getsizeof(key) + sys.getsizeof(value)
+
+    def stats(self):
+        stats = super().stats()
+        stats["bytes"] = self._bytes
+        stats["max_bytes"] = self.max_bytes
+        return stats
@@ -0,0 +1,237 @@
+import csv
+import datetime
+import decimal
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from db_pool import connect_mysql
+from ingest import batched, iter_ndjson
+
+# Parents before children so foreign keys hold while importing. Tables in
+# the same group do not reference each other and can load in parallel.
+TABLE_GROUPS = {
+    "mysql": (("permission_Levels",), ("people",), ("internal_Messages", "payments", "monthly_Reports")),
+    "sqlite": (("Permission_Levels", "Countries", "Roles"), ("People",),
+               ("Internal_Messages", "Payments", "Monthly_Reports")),
+}
+
+# How NULL is written in CSV files, as in MySQL's SELECT ... INTO OUTFILE.
+CSV_NULL = "\\N"
+
+
+def _text(value):
+    if value is None:
+        return CSV_NULL
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, (datetime.date, decimal.Decimal)):
+        return str(value)
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _select_groups(dialect, tables):
+    """TABLE_GROUPS narrowed to ``tables`` (matched case-insensitively)."""
+    wanted = {table.lower() for table in tables}
+    groups = []
+    for group in TABLE_GROUPS[dialect]:
+        selected = tuple(table for table in group if not wanted or table.lower() in wanted)
+        if selected:
+            groups.append(selected)
+    known = {table.lower() for group in TABLE_GROUPS[dialect] for table in group}
+    unknown = wanted - known
+    if unknown:
+        raise click.BadParameter(f"Unknown table(s): {', '.join(sorted(unknown))}", param_hint="TABLES")
+    return groups
+
+
+def _report(results, elapsed):
+    total = 0
+    for table, rows, seconds in results:
+        total += rows
+        click.echo(f"{table:<20} {rows:>10} rows  {seconds:8.2f}s  {rows / seconds if seconds else 0:>12,.0f} rows/s")
+    click.echo(f"{'total':<20} {total:>10} rows  {elapsed:8.2f}s  {total / elapsed if elapsed else 0:>12,.0f} rows/s")
+
+
+def _run_groups(groups, work, workers):
+    """Run ``work(table)`` for every table, group by group, ``workers`` tables at a time."""
+    app = current_app._get_current_object()
+
+    def in_context(table):
+        with app.app_context():
+            try:
+                return work(table)
+            except Exception as e:
+                raise click.ClickException(f"{table}: {e}")
+
+    results = []
+    with ThreadPoolExecutor(workers) as pool:
+        for group in groups:
+            results.extend(pool.map(in_context, group))
+    return results
+
+
+def create_cli(get_storage):
+    """The ``cms`` command group, working on the storage ``get_storage()`` returns."""
+    cms = AppGroup("cms", help="Bulk import and export of the CMS tables.")
+
+    @cms.command("export")
+    @click.argument("tables", nargs=-1)
+    @click.option("--dir", "directory", default=".", type=click.Path(file_okay=False),
+                  help="Directory to write <table>.csv / <table>.ndjson files to.")
+    @click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), default="csv")
+    @click.option("--workers", default=1, help="Tables exported in parallel.")
+    def export_command(tables, directory, fmt, workers):
+        """Export TABLES (default: all) one file per table, streaming from the database."""
+        storage = get_storage()
+        os.makedirs(directory, exist_ok=True)
+        chunk_size = current_app.config.get("STREAM_CHUNK_SIZE", 1000)
+
+        def export_table(table):
+            start = time.perf_counter()
+            path = os.path.join(directory, f"{table.lower()}.{fmt}")
+            rows = 0
+            cur = storage.server_side_cursor()
+            cur.execute(f"SELECT * FROM {table}")
+            columns = [column[0] for column in cur.description]
+            with open(path, "w", newline="", encoding="utf-8") as out:
+                if fmt == "csv":
+                    writer = csv.writer(out)
+                    writer.writerow(columns)
+                while True:
+                    chunk = cur.fetchmany(chunk_size)
+                    if not chunk:
+                        break
+                    rows += len(chunk)
+                    if fmt == "csv":
+                        writer.writerows([_text(row[column]) for column in columns] for row in chunk)
+                    else:
+                        out.write("".join(json.dumps(row, default=_json_default) + "\n" for row in chunk))
+            cur.close()
+            return table, rows, time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = _run_groups(_select_groups(storage.dialect, tables), export_table, workers)
+        _report(results, time.perf_counter() - start)
+
+    @cms.command("import")
+    @click.argument("tables", nargs=-1)
+    @click.option("--dir", "directory", default=".", type=click.Path(exists=True, file_okay=False),
+                  help="Directory holding <table>.csv / <table>.ndjson files.")
+    @click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), default="csv")
+    @click.option("--batch-size", default=50000, help="Rows per executemany and transaction.")
+    @click.option("--workers", default=1, help="Tables loaded in parallel (MySQL only).")
+    @click.option("--replace", is_flag=True, help="Replace rows whose primary key already exists.")
+    def import_command(tables, directory, fmt, batch_size, workers, replace):
+        """Import TABLES (default: every file found) in foreign key order.
+
+        CSV files on MySQL go through LOAD DATA LOCAL INFILE; everything else
+        is inserted with executemany, one transaction per batch.
+        """
+        storage = get_storage()
+        groups = [
+            tuple(table for table in group if os.path.exists(os.path.join(directory, f"{table.lower()}.{fmt}")))
+            for group in _select_groups(storage.dialect, tables)
+        ]
+        groups = [group for group in groups if group]
+        if storage.dialect == "sqlite" and workers > 1:
+            # A SQLite file has one writer at a time; more workers would only queue.
+            click.echo("SQLite takes one writer at a time; importing with 1 worker.")
+            workers = 1
+
+        def import_table(table):
+            start = time.perf_counter()
+            path = os.path.join(directory, f"{table.lower()}.{fmt}")
+            if storage.dialect == "mysql" and fmt == "csv":
+                rows = _load_data_infile(current_app.config, table, path, replace)
+            else:
+                rows = _insert_batches(storage, table, path, fmt, batch_size, replace)
+            return table, rows, time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = _run_groups(groups, import_table, workers)
+        _report(results, time.perf_counter() - start)
+
+    return cms
+
+
+def _read_rows(path, fmt):
+    """``(columns, rows)`` of an export file, rows as tuples read lazily."""
+    if fmt == "csv":
+        handle = open(path, newline="", encoding="utf-8")
+        reader = csv.reader(handle)
+        columns = next(reader)
+
+        def rows():
+            with handle:
+                for row in reader:
+                    yield tuple(None if value == CSV_NULL else value for value in row)
+        return columns, rows()
+
+    handle = open(path, "rb")
+    objects = iter_ndjson(handle)
+    first = next(objects, None)
+    if first is None:
+        handle.close()
+        return [], iter(())
+    columns = list(first)
+
+    def rows():
+        with handle:
+            yield tuple(first[column] for column in columns)
+            for obj in objects:
+                yield tuple(obj[column] for column in columns)
+    return columns, rows()
+
+
+def _insert_batches(storage, table, path, fmt, batch_size, replace):
+    columns, rows = _read_rows(path, fmt)
+    if not columns:
+        return 0
+    verb = ("INSERT OR REPLACE" if storage.dialect == "sqlite" else "REPLACE") if replace else "INSERT"
+    sql = f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    count = 0
+    with storage.session(write=True) as conn:
+        cur = conn.cursor()
+        for batch in batched(rows, batch_size):
+            try:
+                cur.executemany(sql, batch)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            count += len(batch)
+        cur.close()
+    return count
+
+
+def _load_data_infile(config, table, path, replace):
+    with open(path, newline="", encoding="utf-8") as handle:
+        columns = next(csv.reader(handle))
+    # Read every field into a variable so \N can be turned into NULL without
+    # giving backslashes in the data a special meaning.
+    variables = [f"@v{i}" for i in range(len(columns))]
+    assignments = ", ".join(f"{column} = NULLIF({variable}, '\\\\N')" for column, variable in zip(columns, variables))
+    sql = (f"LOAD DATA LOCAL INFILE %s {'REPLACE' if replace else ''} INTO TABLE {table} "
+           "CHARACTER SET utf8mb4 FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+           f"LINES TERMINATED BY '\\r\\n' IGNORE 1 LINES ({', '.join(variables)}) SET {assignments}")
+    # A connection of its own: LOCAL INFILE has to be allowed when connecting.
+    conn = connect_mysql({**config, "MYSQL_LOCAL_INFILE": True})
+    try:
+        cur = conn.cursor()
+        cur.execute(sql, (os.path.abspath(path),))
+        conn.commit()
+        return cur.rowcount
+    finally:
+        conn.close()
@@ -0,0 +1,145 @@
+import gzip
+import threading
+import zlib
+
+from flask import request
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = ("text/", "application/json", "application/x-ndjson", "+json")
+
+
+class _ZstdStream:
+    """zstandard stream compressor with the compressobj() interface used below."""
+
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self, mode=None):
+        if mode == zlib.Z_SYNC_FLUSH:
+            return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._compressor.flush()
+
+
+class Compressor:
+    """Negotiated Content-Encoding (zstd, gzip, deflate) for responses.
+
+    Buffered responses smaller than COMPRESS_MIN_SIZE are sent as they are.
+    Streamed responses are compressed chunk by chunk, flushing after each
+    one, so clients still get rows as they are produced. zstd is offered
+    only when the ``zstandard`` package is installed.
+    """
+
+    def __init__(self, app=None):
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._bytes_in = 0
+        self._bytes_out = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("COMPRESS_ENABLED", True)
+        app.config.setdefault("COMPRESS_ALGORITHMS", ("zstd", "gzip", "deflate"))
+        app.config.setdefault("COMPRESS_LEVEL", 6)
+        app.config.setdefault("COMPRESS_ZSTD_LEVEL", 3)
+        app.config.setdefault("COMPRESS_MIN_SIZE", 1024)
+        self.config = app.config
+        app.after_request(self.after_request)
+
+    @property
+    def algorithms(self):
+        return [name for name in self.config["COMPRESS_ALGORITHMS"] if name != "zstd" or zstandard is not None]
+
+    def compressobj(self, encoding):
+        level = self.config["COMPRESS_LEVEL"]
+        if encoding == "zstd":
+            return _ZstdStream(self.config["COMPRESS_ZSTD_LEVEL"])
+        # wbits 31 writes a gzip header, 15 the zlib format HTTP calls "deflate".
+        return zlib.compressobj(level, zlib.DEFLATED, 31 if encoding == "gzip" else 15)
+
+    def compress(self, encoding, data):
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.config["COMPRESS_ZSTD_LEVEL"]).compress(data)
+        if encoding == "gzip":
+            return gzip.compress(data, self.config["COMPRESS_LEVEL"], mtime=0)
+        return zlib.compress(data, self.config["COMPRESS_LEVEL"])
+
+    def _should_compress(self, response):
+        if not self.config["COMPRESS_ENABLED"] or request.method == "HEAD":
+            return False
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if "Content-Encoding" in response.headers or response.direct_passthrough:
+            return False
+        if "no-transform" in response.cache_control:
+            return False
+        mimetype = response.mimetype or ""
+        if not any(mimetype.startswith(t) or mimetype.endswith(t) for t in COMPRESSIBLE_MIMETYPES):
+            return False
+        return response.is_streamed or response.content_length >= self.config["COMPRESS_MIN_SIZE"]
+
+    def after_request(self, response):
+        response.vary.add("Accept-Encoding")
+        if not self._should_compress(response):
+            return response
+        encoding = request.accept_encodings.best_match(self.algorithms)
+        if encoding is None:
+            return response
+        if response.is_streamed:
+            response.response = self._stream(encoding, response.iter_encoded(), response.response)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            response.set_data(self.compress(encoding, data))
+            self._count(encoding, len(data), response.content_length)
+        response.headers["Content-Encoding"] = encoding
+        # The compressed bytes are a different representation; keep strong ETags distinct.
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(f"{etag}-{encoding}")
+        return response
+
+    def _stream(self, encoding, chunks, source):
+        compressor = self.compressobj(encoding)
+        size_in = size_out = 0
+        try:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                size_in += len(chunk)
+                data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                size_out += len(data)
+                if data:
+                    yield data
+            data = compressor.flush()
+            size_out += len(data)
+            yield data
+        finally:
+            # Closing the source runs its own cleanup (e.g. releasing a cursor).
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()
+            self._count(encoding, size_in, size_out)
+
+    def _count(self, encoding, size_in, size_out):
+        with self._lock:
+            self._counts[encoding] = self._counts.get(encoding, 0) + 1
+            self._bytes_in += size_in
+            self._bytes_out += size_out
+
+    def stats(self):
+        with self._lock:
+            return {
+                "algorithms": self.algorithms,
+                "responses": dict(self._counts),
+                "bytes_in": self._bytes_in,
+                "bytes_out": self._bytes_out,
+                "ratio": round(self._bytes_out / self._bytes_in, 4) if self._bytes_in else 0.0,
+            }
@@ -0,0 +1,10 @@
+-- Secondary indexes used by the API's list endpoints.
+-- InnoDB secondary indexes carry the primary key, so each of these also
+-- covers the (sort column, primary key) keyset used for pagination.
+
+CREATE INDEX idx_permission_levels_description ON permission_levels (Permission_Level_Description);
+CREATE INDEX idx_people_login_name ON people (Login_Name);
+CREATE INDEX idx_payments_amount_due ON payments (Amount_Due);
+CREATE INDEX idx_payments_date_paid ON payments (Date_Paid);
+CREATE INDEX idx_internal_messages_date_sent ON internal_messages (Date_Message_Sent);
+CREATE INDEX idx_monthly_reports_date_sent ON monthly_reports (Date_Report_Sent);
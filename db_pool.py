@@ -0,0 +1,269 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out before the timeout."""
+
+
+class ConnectionPool:
+    """Bounded pool of DB-API connections.
+
+    Idle connections are kept in a LIFO deque so the most recently used ones
+    are handed out first and the rest can age out through idle eviction.
+    A connection that has been idle for longer than ``ping_after`` seconds
+    is pinged before it is handed out and replaced if it is dead.
+    """
+
+    def __init__(self, connect, min_size=2, max_size=10, timeout=5.0,
+                 idle_timeout=300.0, ping_after=1.0):
+        if min_size > max_size:
+            raise ValueError("min_size cannot be larger than max_size")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+
+        self._idle = deque()  # (connection, last_used) pairs, oldest on the left
+        self._cond = threading.Condition()
+        self._size = 0
+        self._in_use = 0
+
+        # Counters
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._closed = 0
+        self._replaced = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def warm_up(self):
+        """Open connections until the pool holds at least ``min_size``."""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        stale = []
+        conn = None
+        last_used = None
+        timed_out = False
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                stale.extend(self._evict_idle(now))
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._timeouts += 1
+                    timed_out = True
+                    break
+                self._cond.wait(remaining)
+            if not timed_out:
+                self._in_use += 1
+        self._close_all(stale)
+        if timed_out:
+            raise PoolTimeout(
+                f"No database connection available after {self.timeout}s (max {self.max_size})"
+            )
+
+        try:
+            if conn is None:
+                conn = self._open()
+            elif time.monotonic() - last_used > self.ping_after and not self._alive(conn):
+                self._discard(conn)
+                with self._cond:
+                    self._replaced += 1
+                conn = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            self._wait_total += waited
+            if waited > self._wait_max:
+                self._wait_max = waited
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, rolling back any open transaction."""
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        if discard:
+            self._discard(conn)
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+        self._close_all(idle)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "closed": self._closed,
+                "replaced": self._replaced,
+                "wait_time_total": round(self._wait_total, 6),
+                "wait_time_max": round(self._wait_max, 6),
+                "wait_time_avg": round(self._wait_total / self._checkouts, 6) if self._checkouts else 0.0,
+            }
+
+    def _open(self):
+        conn = self._connect()
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._closed += 1
+
+    def _close_all(self, conns):
+        for conn in conns:
+            self._discard(conn)
+
+    def _alive(self, conn):
+        try:
+            conn.ping()
+            return True
+        except Exception:
+            return False
+
+    def _evict_idle(self, now):
+        # Called with the lock held; returns connections for the caller to close.
+        evicted = []
+        while (self._idle and self._size > self.min_size
+               and now - self._idle[0][1] > self.idle_timeout):
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            evicted.append(conn)
+        return evicted
+
+
+def connect_mysql(config):
+    # Drivers are imported lazily so the pool can be used (and tested) without them.
+    if config.get("MYSQL_DRIVER") == "mysql-connector":
+        return _connect_mysql_connector(config)
+
+    import MySQLdb
+    from MySQLdb import cursors
+
+    kwargs = {
+        "host": config["MYSQL_HOST"],
+        "user": config["MYSQL_USER"],
+        "password": config["MYSQL_PASSWORD"],
+        "database": config["MYSQL_DB"],
+        "port": config["MYSQL_PORT"],
+        "charset": config["MYSQL_CHARSET"],
+        "connect_timeout": config["MYSQL_CONNECT_TIMEOUT"],
+    }
+    if config.get("MYSQL_CURSORCLASS"):
+        kwargs["cursorclass"] = getattr(cursors, config["MYSQL_CURSORCLASS"])
+    if config.get("MYSQL_LOCAL_INFILE"):
+        kwargs["local_infile"] = 1
+    return MySQLdb.connect(**kwargs)
+
+
+# MySQLdb.constants.FIELD_TYPE: DECIMAL, TIMESTAMP, DATE, DATETIME, NEWDECIMAL
+PASSTHROUGH_FIELD_TYPES = (0, 7, 10, 12, 246)
+
+
+def passthrough_converter(converter):
+    """A connection's mysqlclient converters, changed to keep DECIMAL and DATE/DATETIME/TIMESTAMP values as sent.
+
+    The server sends them as ``41.10`` and ``2024-05-06 07:08:09``, which is
+    already how the API writes them, so they are decoded straight to str.
+    Everything else is left as the connection decodes it; in particular
+    the str decoding of text columns, which mysqlclient only adds to each
+    connection's own converters, not to ``MySQLdb.converters.conversions``.
+    """
+    converter = dict(converter)
+    for field_type in PASSTHROUGH_FIELD_TYPES:
+        converter[field_type] = str
+    return converter
+
+
+@lru_cache(maxsize=None)
+def _connector_class():
+    from mysql.connector.connection import MySQLConnection
+
+    class DictCursorConnection(MySQLConnection):
+        # Hand out dict rows by default, like MySQLdb with DictCursor.
+        def cursor(self, *args, **kwargs):
+            kwargs.setdefault("dictionary", True)
+            return super().cursor(*args, **kwargs)
+
+    return DictCursorConnection
+
+
+def _connect_mysql_connector(config):
+    return _connector_class()(
+        host=config["MYSQL_HOST"],
+        user=config["MYSQL_USER"],
+        password=config["MYSQL_PASSWORD"],
+        database=config["MYSQL_DB"],
+        port=config["MYSQL_PORT"],
+        charset=config["MYSQL_CHARSET"],
+        connection_timeout=config["MYSQL_CONNECT_TIMEOUT"],
+        allow_local_infile=bool(config.get("MYSQL_LOCAL_INFILE")),
+    )
@@ -0,0 +1,94 @@
+import copy
+import time
+
+from flask import current_app
+
+from cache import FragmentCache
+
+
+class RowFragments:
+    """Serialized JSON of single rows, reused across list responses.
+
+    Rows of payments, internal messages and monthly reports are rarely
+    changed once inserted. A page of them is read as its keys first; only
+    the rows without a cached fragment are then read in full and encoded,
+    and the response is the cached bytes joined together.
+
+    Fragments are keyed by (table, primary key, row version). Row versions
+    are kept in TableVersions, so they are shared as far as the table
+    versions are; PUT and DELETE handlers move the one row they changed
+    through ``row_changed``. Other rows, and inserts, are not affected.
+    """
+
+    def __init__(self, get_storage, versions, app=None):
+        self.get_storage = get_storage
+        self.versions = versions
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("ROW_FRAGMENT_TABLES", ("payments", "internal_messages", "monthly_reports"))
+        app.config.setdefault("ROW_FRAGMENT_CACHE_SIZE", 100000)
+        app.config.setdefault("ROW_FRAGMENT_CACHE_BYTES", 64 * 1024 * 1024)
+        app.config.setdefault("ROW_FRAGMENT_CACHE_TTL", 3600.0)
+        self.config = app.config
+        self.cache = FragmentCache(app.config["ROW_FRAGMENT_CACHE_SIZE"], app.config["ROW_FRAGMENT_CACHE_TTL"],
+                                   app.config["ROW_FRAGMENT_CACHE_BYTES"])
+
+    def covers(self, listing):
+        """Whether a page of ``listing`` can be put together from fragments (whole rows only)."""
+        return listing.fields is None and self._name(listing.resource) is not None
+
+    def page(self, listing):
+        """``(fragments, next_cursor)`` for one page of ``listing``, fragments being bytes."""
+        storage = self.get_storage()
+        resource = listing.resource
+        name = self._name(resource)
+        keys = copy.copy(listing)
+        keys.fields = list(listing.key)
+        cur = storage.cursor(tuples=True)
+        cur.execute(*keys.sql())
+        key_rows, next_cursor = keys.paginate(cur.fetchall(), keys.columns)
+        cur.close()
+        index = keys.columns.index(resource.pk)
+        pks = [row[index] for row in key_rows]
+
+        # Read before the rows, so a fragment is never filed under a newer version than its row.
+        epoch, changed = self.versions.epoch, self.versions.get_rows(name, pks)
+        keys = {pk: (name, pk, epoch, changed.get(pk, (0, 0.0))[0]) for pk in pks}
+        # A replica may not have a recent change yet; do not file its rows under the new version.
+        settled = time.time() - storage.max_read_lag()
+        cacheable = {pk for pk in pks if changed.get(pk, (0, 0.0))[1] <= settled}
+        fragments = dict(zip(pks, self.cache.get_many([keys[pk] for pk in pks])))
+        missing = [pk for pk in pks if fragments.get(pk) is None]
+        if missing:
+            query = (f"SELECT {resource.select_list()} FROM {resource.source}"
+                     f" WHERE {resource.expr(resource.pk)} IN ({', '.join(['%s'] * len(missing))})")
+            cur = storage.cursor()
+            cur.execute(query, missing)
+            rows = cur.fetchall()
+            cur.close()
+            filled = {row[resource.pk]: text.encode() for row, text in zip(rows, current_app.json.encode_rows(rows))}
+            fragments.update(filled)
+            self.cache.set_many([(keys[pk], data) for pk, data in filled.items() if pk in cacheable])
+        # A row deleted between the two reads is left out.
+        return [fragments[pk] for pk in pks if fragments.get(pk) is not None], next_cursor
+
+    def row_changed(self, name, pk):
+        """Move the row's version after a handler updated or deleted it."""
+        if name in self.config["ROW_FRAGMENT_TABLES"]:
+            self.versions.bump_row(name, pk)
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        return self.cache.stats()
+
+    def _name(self, resource):
+        resources = self.get_storage().resources
+        for name in self.config["ROW_FRAGMENT_TABLES"]:
+            if resources.get(name) is resource:
+                return name
+        return None
@@ -0,0 +1,142 @@
+import codecs
+import gzip
+import json
+import re
+
+from werkzeug.exceptions import UnsupportedMediaType
+
+_WHITESPACE = re.compile(r"\s*")
+
+
+class _TextReader:
+    """UTF-8 text read from a byte stream in chunks, with a cursor into the unread part."""
+
+    def __init__(self, stream, read_size, max_item):
+        self.stream = stream
+        self.read_size = read_size
+        self.max_item = max_item
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Read the next chunk, dropping what was consumed; False at the end of the stream."""
+        if self.eof:
+            return False
+        if len(self.buffer) - self.pos > self.max_item:
+            raise ValueError(f"Row larger than {self.max_item} characters.")
+        chunk = self.stream.read(self.read_size)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + self.decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Next non-whitespace character, not consumed; "" at the end."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def value(self, decoder):
+        while True:
+            self.peek()
+            try:
+                value, end = decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # Most likely cut off at the end of the chunk; retry with more
+                # text unless a whole row's worth is already there.
+                if len(self.buffer) - self.pos > self.max_item:
+                    raise ValueError(f"Invalid JSON ({e.msg}), or a row larger than {self.max_item} characters.")
+                if not self.fill():
+                    raise ValueError(f"Invalid JSON: {e.msg}.")
+                continue
+            # A number at the very end may continue in the next chunk.
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def lines(self):
+        while True:
+            end = self.buffer.find("\n", self.pos)
+            if end < 0:
+                if self.fill():
+                    continue
+                if self.pos < len(self.buffer):
+                    yield self.buffer[self.pos:]
+                return
+            line = self.buffer[self.pos:end]
+            self.pos = end + 1
+            yield line
+
+
+def iter_json(stream, read_size=65536, max_item=1 << 20):
+    """Yield the elements of a JSON array one by one as ``stream`` is read.
+
+    Only the current element (at most ``max_item`` characters) and one chunk
+    are held in memory. A body holding a single object yields that object.
+    """
+    reader = _TextReader(stream, read_size, max_item)
+    decoder = json.JSONDecoder()
+    first = reader.peek()
+    if first == "":
+        raise ValueError("Empty request body.")
+    if first != "[":
+        yield reader.value(decoder)
+    else:
+        reader.pos += 1
+        if reader.peek() == "]":
+            reader.pos += 1
+        else:
+            while True:
+                yield reader.value(decoder)
+                separator = reader.peek()
+                reader.pos += 1
+                if separator == "]":
+                    break
+                if separator != ",":
+                    raise ValueError(f"Expected ',' or ']' in the JSON array, found {separator!r}.")
+    if reader.peek() != "":
+        raise ValueError("Extra data after the JSON body.")
+
+
+def iter_ndjson(stream, read_size=65536, max_item=1 << 20):
+    """Yield one value per non-blank line of a newline-delimited JSON stream."""
+    reader = _TextReader(stream, read_size, max_item)
+    for number, line in enumerate(reader.lines(), 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise ValueError(f"Line {number} is not valid JSON.")
+
+
+def batched(rows, size):
+    """Lists of up to ``size`` consecutive rows."""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def request_rows(request, read_size=65536, max_item=1 << 20):
+    """Rows of a JSON array or NDJSON request body, parsed as the body is read.
+
+    ``Content-Encoding: gzip`` bodies are decompressed on the fly.
+    """
+    stream = request.stream
+    encoding = (request.content_encoding or "identity").lower()
+    if encoding == "gzip":
+        stream = gzip.GzipFile(fileobj=stream, mode="rb")
+    elif encoding != "identity":
+        raise UnsupportedMediaType(f"Unsupported Content-Encoding '{encoding}'; use gzip or none.")
+    parse = iter_ndjson if request.mimetype == "application/x-ndjson" else iter_json
+    return parse(stream, read_size, max_item)
@@ -0,0 +1,155 @@
+import datetime
+import decimal
+import json
+import threading
+from json.encoder import encode_basestring, encode_basestring_ascii
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# How a column's values are written, by the type of the first value seen;
+# ``{0}`` is the value. Anything else goes through the generic encoder.
+# Where a subclass would be accepted and written wrongly (bool as int, a
+# datetime losing its time through date.isoformat) the class is checked.
+_FAST_FORMATS = {
+    int: "int.__repr__({0}) if {0}.__class__ is int else slow({0})",
+    float: "float.__repr__({0})",
+    str: "esc({0})",
+    decimal.Decimal: "'\"' + decimal.Decimal.__str__({0}) + '\"'",
+    datetime.datetime: ("'\"' + datetime.datetime.isoformat({0}, ' ', 'seconds') + '\"'"
+                        " if {0}.__class__ is datetime.datetime else slow({0})"),
+    datetime.date: "'\"' + datetime.date.isoformat({0}) + '\"' if {0}.__class__ is datetime.date else slow({0})",
+}
+
+# Types orjson writes itself; Decimal and datetime would go through the
+# Python default hook per value, slower than the generated encoder.
+_ORJSON_NATIVE = {int, float, str, bool}
+
+
+def _default(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime(DATETIME_FORMAT)
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return DefaultJSONProvider.default(value)
+
+
+class RowJSONProvider(DefaultJSONProvider):
+    """JSON provider with a fast path for database rows.
+
+    Datetimes are written as ``YYYY-MM-DD HH:MM:SS`` and Decimals as strings.
+    Each row shape (the keys of dict rows; for tuple rows the cursor's
+    column names and types, or the first row's value types) gets an
+    encoder chosen from the types in the first rows seen: ``orjson``, when it
+    is installed and handles every column itself, or else a generated
+    function that formats a whole row with one ``%`` operation and no
+    per-value type dispatch. A row that does not fit the generated encoder
+    (say a string where the sample had a Decimal) goes through
+    ``json.dumps`` instead.
+    """
+
+    default = staticmethod(_default)
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._encoders = {}
+        self._lock = threading.Lock()
+
+    def dumps_rows(self, rows, separator=",", description=None):
+        """Encode ``rows`` (dicts or tuples of one shape) each on its own, joined by ``separator``."""
+        return separator.join(self.encode_rows(rows, description))
+
+    def encode_rows(self, rows, description=None):
+        """The JSON of each of ``rows``, as a list of strings.
+
+        Tuple rows should come with their cursor's ``description``, so that
+        result sets of the same width but other columns get their own encoder.
+        """
+        if not rows:
+            return []
+        first = rows[0]
+        if isinstance(first, dict):
+            shape = tuple(first)
+        elif description is not None:
+            shape = (len(first), tuple((column[0], column[1]) for column in description))
+        else:
+            shape = (len(first), tuple(value.__class__ for value in first))
+        encoder = self._encoders.get(shape)
+        if encoder is None:
+            encoder = self._encoder(shape, rows)
+        return list(map(encoder, rows))
+
+    def rows_response(self, rows, key=None):
+        """Response with the JSON array of ``rows``, or ``{key: rows}``."""
+        body = "[" + self.dumps_rows(rows) + "]"
+        if key:
+            body = f"{{{self.dumps(key)}:{body}}}"
+        return self._app.response_class(body + "\n", mimetype=self.mimetype)
+
+    def fragments_response(self, fragments, key=None):
+        """Like ``rows_response``, for rows already encoded (as bytes)."""
+        body = b"[" + b",".join(fragments) + b"]"
+        if key:
+            body = b"{" + self.dumps(key).encode() + b":" + body + b"}"
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+    def _slow(self, row):
+        return json.dumps(row, default=_default, ensure_ascii=self.ensure_ascii, sort_keys=self.sort_keys,
+                          separators=(",", ":"))
+
+    def _encoder(self, shape, rows):
+        keyed = isinstance(rows[0], dict)
+        # Columns whose type the sample rows show; NULL-only columns stay generic.
+        types = {}
+        for row in rows[:100]:
+            for index, value in enumerate(row.values() if keyed else row):
+                if value is not None and index not in types:
+                    types[index] = value.__class__
+        if orjson is not None and set(types.values()) <= _ORJSON_NATIVE:
+            return self._store(shape, self._orjson_encoder())
+        columns = list(enumerate(shape if keyed else range(shape[0])))
+        if keyed and self.sort_keys:
+            columns.sort(key=lambda column: column[1])
+        esc = encode_basestring_ascii if self.ensure_ascii else encode_basestring
+        template, values = [], []
+        for index, column in columns:
+            value = f"row[{column!r}]"
+            fast = _FAST_FORMATS.get(types.get(index))
+            if fast is None:
+                values.append(f"slow({value})")
+            else:
+                values.append(f"'null' if {value} is None else ({fast.format(value)})")
+            template.append(esc(column).replace("%", "%%") + ":%s" if keyed else "%s")
+        template = ("{%s}" if keyed else "[%s]") % ",".join(template)
+        # Compiled like collections.namedtuple builds its classes.
+        source = (
+            "def encode(row):\n"
+            "    try:\n"
+            f"        return {template!r} % ({', '.join(values)},)\n"
+            "    except (TypeError, AttributeError, KeyError, IndexError):\n"
+            "        return slow(row)\n"
+        )
+        namespace = {"esc": esc, "decimal": decimal, "datetime": datetime, "slow": self._slow}
+        exec(source, namespace)
+        return self._store(shape, namespace["encode"])
+
+    def _orjson_encoder(self):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+        dumps = orjson.dumps
+
+        def encode(row):
+            return dumps(row, default=_default, option=option).decode()
+        return encode
+
+    def _store(self, shape, encoder):
+        with self._lock:
+            self._encoders[shape] = encoder
+        return encoder
@@ -0,0 +1,325 @@
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from werkzeug.exceptions import BadRequest
+
+
+class Resource:
+    """Describes a table served by a collection endpoint.
+
+    ``sortable`` only lists NOT NULL columns: keyset seeks compare with
+    ``>``/``<``, which never match NULLs, so a nullable sort key would drop rows.
+    ``indexed`` lists the columns with an index (see database/indexes.sql);
+    only those can be filtered on unless unindexed filters are allowed.
+
+    Where the stored schema differs from the API's columns, ``source`` is the
+    FROM clause to read from, ``expressions`` maps API columns to the SQL
+    that reads them and ``assignments`` maps them to ``(stored column, value
+    SQL)`` for writes.
+    """
+
+    def __init__(self, table, pk, columns, sortable=(), indexed=(), source=None,
+                 expressions=None, assignments=None):
+        self.table = table
+        self.pk = pk
+        self.columns = tuple(columns)
+        self.sortable = frozenset(sortable) | {pk}
+        self.indexed = frozenset(indexed) | self.sortable
+        self.source = source or table
+        self.expressions = dict(expressions or {})
+        self.assignments = dict(assignments or {})
+
+    def expr(self, column):
+        return self.expressions.get(column, column)
+
+    def select_list(self, columns=None):
+        return ", ".join(
+            column if self.expr(column) == column else f"{self.expr(column)} AS {column}"
+            for column in columns or self.columns
+        )
+
+    def lookup_sql(self, column, columns=None):
+        return f"SELECT {self.select_list(columns)} FROM {self.source} WHERE {self.expr(column)} = %s"
+
+    def _assignment(self, column):
+        return self.assignments.get(column, (column, "%s"))
+
+    def insert_sql(self, columns):
+        targets, values = zip(*(self._assignment(column) for column in columns))
+        return f"INSERT INTO {self.table} ({', '.join(targets)}) VALUES ({', '.join(values)})"
+
+    def upsert_sql(self, columns, rows, dialect):
+        """Multi-row INSERT that updates the existing row when the primary key is taken."""
+        targets, values = zip(*(self._assignment(column) for column in columns))
+        row = f"({', '.join(values)})"
+        sql = f"INSERT INTO {self.table} ({', '.join(targets)}) VALUES {', '.join([row] * rows)}"
+        updates = [target for target in targets if target != self.pk]
+        if dialect == "sqlite":
+            return sql + f" ON CONFLICT ({self.pk}) DO UPDATE SET " + ", ".join(
+                f"{target} = excluded.{target}" for target in updates)
+        return sql + " ON DUPLICATE KEY UPDATE " + ", ".join(f"{target} = VALUES({target})" for target in updates)
+
+    def update_sql(self, columns):
+        assignments = ", ".join("{} = {}".format(*self._assignment(column)) for column in columns)
+        return f"UPDATE {self.table} SET {assignments} WHERE {self.pk} = %s"
+
+
+RESOURCES = {
+    "permission_levels": Resource(
+        "permission_Levels", "Permission_Level_Code",
+        ["Permission_Level_Code", "Permission_Level_Description"],
+        sortable=["Permission_Level_Description"],
+    ),
+    "people": Resource(
+        "people", "Person_ID",
+        ["Person_ID", "Permission_Level_Code", "Login_Name", "Password", "Personal_Details",
+         "Other_Details", "Country_Name", "Role_Description"],
+        sortable=["Login_Name"],
+        indexed=["Permission_Level_Code"],
+    ),
+    "internal_messages": Resource(
+        "internal_Messages", "Message_ID",
+        ["Message_ID", "Msg_From_Person_ID", "Msg_To_Person_ID", "Date_Message_Sent",
+         "Message_Subject", "Message_Text"],
+        sortable=["Date_Message_Sent"],
+        indexed=["Msg_From_Person_ID", "Msg_To_Person_ID"],
+    ),
+    "payments": Resource(
+        "payments", "Payment_ID",
+        ["Payment_ID", "Person_ID", "Amount_Due", "Reminder_Sent_YN", "Date_Reminder_Sent",
+         "Date_Paid", "Other_Details"],
+        sortable=["Amount_Due"],
+        indexed=["Person_ID", "Date_Paid"],
+    ),
+    "monthly_reports": Resource(
+        "monthly_Reports", "Report_ID",
+        ["Report_ID", "Person_ID", "Date_Report_Sent", "Report_Text"],
+        sortable=["Date_Report_Sent"],
+        indexed=["Person_ID"],
+    ),
+}
+
+# The bundled SQLite database stores a person's country and role as codes
+# into the Countries and Roles tables rather than by name.
+SQLITE_RESOURCES = dict(RESOURCES)
+SQLITE_RESOURCES["people"] = Resource(
+    "People", "Person_ID",
+    RESOURCES["people"].columns,
+    sortable=["Login_Name"],
+    indexed=["Permission_Level_Code"],
+    source=("People"
+            " LEFT JOIN Countries ON Countries.Country_Code = People.Country_Code"
+            " LEFT JOIN Roles ON Roles.Role_Code = People.Role_Code"),
+    expressions={
+        **{column: f"People.{column}" for column in RESOURCES["people"].columns},
+        "Country_Name": "Countries.Country_Name",
+        "Role_Description": "Roles.Role_Description",
+    },
+    assignments={
+        "Country_Name": ("Country_Code", "(SELECT Country_Code FROM Countries WHERE Country_Name = %s)"),
+        "Role_Description": ("Role_Code", "(SELECT Role_Code FROM Roles WHERE Role_Description = %s)"),
+    },
+)
+
+
+def _cursor_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, (datetime.date, decimal.Decimal)):
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    raw = json.dumps([_cursor_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error):
+        raise BadRequest("Invalid 'after' cursor.")
+    if not isinstance(values, list) or len(values) != size:
+        raise BadRequest("Invalid 'after' cursor.")
+    return values
+
+
+FILTER_OPERATORS = ("eq", "in", "range", "null", "prefix")
+
+
+def _escape_like(value):
+    # "!" rather than backslash: MySQL and SQLite disagree on backslashes in literals.
+    return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def parse_filter(column, expression):
+    """Compile one ``?Column=op:value`` filter to ``(sql, params)``.
+
+    ``eq:v`` (or a bare ``v``), ``in:a,b,c``, ``range:lo..hi`` (lower bound
+    inclusive, upper bound exclusive, either side optional), ``null:true`` /
+    ``null:false`` and ``prefix:abc``.
+    """
+    op, sep, value = expression.partition(":")
+    if not sep or op not in FILTER_OPERATORS:
+        op, value = "eq", expression
+
+    if op == "eq":
+        return f"{column} = %s", [value]
+    if op == "in":
+        values = [v for v in value.split(",") if v != ""]
+        if not values:
+            raise BadRequest(f"Filter on '{column}': 'in' needs at least one value.")
+        return f"{column} IN ({', '.join(['%s'] * len(values))})", values
+    if op == "range":
+        low, sep, high = value.partition("..")
+        if not sep or not (low or high):
+            raise BadRequest(f"Filter on '{column}': 'range' must look like 'low..high'.")
+        clauses, params = [], []
+        if low:
+            clauses.append(f"{column} >= %s")
+            params.append(low)
+        if high:
+            clauses.append(f"{column} < %s")
+            params.append(high)
+        return " AND ".join(clauses), params
+    if op == "null":
+        if value.lower() not in ("true", "false"):
+            raise BadRequest(f"Filter on '{column}': 'null' must be 'true' or 'false'.")
+        return f"{column} IS {'' if value.lower() == 'true' else 'NOT '}NULL", []
+    # prefix: a LIKE with a constant prefix can still use the index.
+    if not value:
+        raise BadRequest(f"Filter on '{column}': 'prefix' needs a value.")
+    return f"{column} LIKE %s ESCAPE '!'", [_escape_like(value) + "%"]
+
+
+class ListQuery:
+    """Keyset (seek) pagination over a Resource.
+
+    ``?limit=`` is capped at ``max_limit``; ``?after=`` is the opaque cursor
+    from the previous page's ``next``; ``?sort=col`` / ``?sort=-col`` orders
+    by a sortable column with the primary key as tiebreaker. Each page is a
+    single index range scan, so deep pages cost the same as the first one.
+
+    ``?fields=a,b`` narrows the SELECT list to those columns. The pagination
+    key columns are always selected since the next cursor is built from them.
+
+    Any other argument named after a column is a filter (see parse_filter).
+    Filters are ANDed together and with the seek predicate.
+
+    A ``stream`` sends its rows before it could know whether there is a
+    next page, so it reads exactly ``limit`` rows and has no next cursor.
+    """
+
+    def __init__(self, resource, limit=None, after=None, sort=None, descending=False, fields=None,
+                 filters=(), stream=False):
+        self.resource = resource
+        self.limit = limit
+        self.after = after
+        self.sort = sort or resource.pk
+        self.descending = descending
+        self.fields = fields
+        self.filters = list(filters)
+        self.stream = stream
+
+    @classmethod
+    def from_args(cls, resource, args, default_limit, max_limit, stream=False, allow_unindexed=False):
+        limit = args.get("limit")
+        if limit is None:
+            # Streams are not paged unless the client asks for it.
+            limit = None if stream else default_limit
+        else:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise BadRequest("'limit' must be an integer.")
+            if limit < 1:
+                raise BadRequest("'limit' must be at least 1.")
+            limit = min(limit, max_limit)
+
+        sort = args.get("sort") or resource.pk
+        descending = sort.startswith("-")
+        sort = sort.lstrip("-")
+        if sort not in resource.sortable:
+            raise BadRequest(f"Cannot sort by '{sort}'. Sortable columns: {', '.join(sorted(resource.sortable))}.")
+
+        after = args.get("after")
+        if after:
+            after = decode_cursor(after, 1 if sort == resource.pk else 2)
+
+        fields = args.get("fields")
+        if fields:
+            fields = [field.strip() for field in fields.split(",") if field.strip()]
+            unknown = [field for field in fields if field not in resource.columns]
+            if unknown:
+                raise BadRequest(f"Unknown field(s): {', '.join(unknown)}. Available fields: {', '.join(resource.columns)}.")
+
+        filters = []
+        for column in resource.columns:
+            expressions = args.getlist(column)
+            if not expressions:
+                continue
+            if column not in resource.indexed and not allow_unindexed:
+                raise BadRequest(f"Cannot filter on unindexed column '{column}'. Indexed columns: {', '.join(sorted(resource.indexed))}.")
+            filters.extend(parse_filter(resource.expr(column), expression) for expression in expressions)
+        return cls(resource, limit=limit, after=after, sort=sort, descending=descending,
+                   fields=fields or None, filters=filters, stream=stream)
+
+    @property
+    def columns(self):
+        if not self.fields:
+            return self.resource.columns
+        wanted = set(self.fields) | set(self.key)
+        # Keep the table's column order so responses look the same however fields= is written.
+        return tuple(column for column in self.resource.columns if column in wanted)
+
+    @property
+    def key(self):
+        if self.sort == self.resource.pk:
+            return (self.resource.pk,)
+        return (self.sort, self.resource.pk)
+
+    def sql(self):
+        """Return ``(query, params)`` for the page."""
+        resource = self.resource
+        pk, sort = resource.expr(resource.pk), resource.expr(self.sort)
+        op, direction = ("<", " DESC") if self.descending else (">", "")
+        where, params = [], []
+        for clause, values in self.filters:
+            where.append(clause)
+            params.extend(values)
+        if self.after is not None:
+            if len(self.key) == 1:
+                where.append(f"{pk} {op} %s")
+                params.extend(self.after)
+            else:
+                sort_value, pk_value = self.after
+                where.append(f"({sort} {op} %s OR ({sort} = %s AND {pk} {op} %s))")
+                params.extend([sort_value, sort_value, pk_value])
+
+        query = f"SELECT {resource.select_list(self.columns)} FROM {resource.source}"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY " + ", ".join(resource.expr(column) + direction for column in self.key)
+        if self.limit is not None:
+            # One extra row tells a page whether there is a next one.
+            query += " LIMIT %s"
+            params.append(self.limit if self.stream else self.limit + 1)
+        return query, params
+
+    def paginate(self, rows, columns=None):
+        """Trim the look-ahead row and return ``(rows, next_cursor)``.
+
+        Rows are dicts, or tuples laid out as ``columns`` when it is given.
+        """
+        rows = list(rows)
+        if self.limit is None or len(rows) <= self.limit:
+            return rows, None
+        rows = rows[:self.limit]
+        last = rows[-1]
+        if columns is not None:
+            return rows, encode_cursor([last[columns.index(column)] for column in self.key])
+        return rows, encode_cursor([last[column] for column in self.key])
@@ -0,0 +1,167 @@
+import hmac
+import math
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# people.Password is varchar(100): "pbkdf2:sha256:<iterations>$<salt>$<64 hex>"
+# only fits with a 12 character salt.
+SALT_LENGTH = 12
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full; ``retry_after`` is in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Password hashing queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def is_hash(stored):
+    return stored.count("$") == 2 and stored.startswith(("pbkdf2:", "scrypt:"))
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a bounded pool of worker threads.
+
+    PBKDF2 runs in OpenSSL without the GIL, so ``workers`` threads keep that
+    many cores busy while request threads wait. At most ``queue_size`` more
+    jobs may wait for a worker; past that, calls raise HasherBusy straight
+    away instead of piling up request threads.
+
+    ``iterations`` is the cost factor. Hashes made with other parameters, and
+    passwords still stored in plain text, get a new hash when they verify.
+    """
+
+    def __init__(self, iterations=600000, workers=None, queue_size=32):
+        self.iterations = iterations
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self._slots = threading.BoundedSemaphore(self.workers + queue_size)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = 0
+        self._rejected = 0
+        self._rehashed = 0
+        self._time_total = 0.0
+
+    @property
+    def method(self):
+        return f"pbkdf2:sha256:{self.iterations}"
+
+    def needs_rehash(self, stored):
+        return not is_hash(stored) or stored.split("$", 1)[0] != self.method
+
+    def hash(self, password):
+        return self._run(self._hash, password)
+
+    def hash_many(self, passwords, chunk_size=8):
+        """``[hash(password) for password in passwords]``, spread over all the workers.
+
+        The batch takes up to ``workers`` slots for its whole run (HasherBusy
+        if there is none free) and keeps one job of ``chunk_size`` passwords
+        in flight per slot. Other callers' jobs queue between the chunks, so
+        a large batch delays a login by about one chunk, not the whole batch.
+        """
+        chunks = [passwords[start:start + chunk_size] for start in range(0, len(passwords), chunk_size)]
+        held = 0
+        while held < min(self.workers, len(chunks)) and self._slots.acquire(blocking=False):
+            held += 1
+        if chunks and not held:
+            with self._lock:
+                self._rejected += 1
+            raise HasherBusy(self.retry_after())
+        results = [None] * len(chunks)
+        pending = {}
+        try:
+            todo = iter(enumerate(chunks))
+            for index, chunk in islice(todo, held):
+                pending[self._pool().submit(self._timed, self._hash_chunk, chunk, jobs=len(chunk))] = index
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+                    for index, chunk in islice(todo, 1):
+                        pending[self._pool().submit(self._timed, self._hash_chunk, chunk, jobs=len(chunk))] = index
+        finally:
+            # On failure, let the chunks already running finish before giving their slots back.
+            for future in pending:
+                future.cancel()
+            wait(pending)
+            for _ in range(held):
+                self._slots.release()
+        return [hashed for chunk in results for hashed in chunk]
+
+    def verify(self, password, stored):
+        """Return ``(ok, new_hash)``; ``new_hash`` is set when ``stored`` should be replaced."""
+        return self._run(self._verify, password, stored)
+
+    def _hash(self, password):
+        return generate_password_hash(password, method=self.method, salt_length=SALT_LENGTH)
+
+    def _hash_chunk(self, passwords):
+        return [self._hash(password) for password in passwords]
+
+    def _verify(self, password, stored):
+        if is_hash(stored):
+            ok = check_password_hash(stored, password)
+        else:
+            # Legacy plain text password
+            ok = hmac.compare_digest(stored.encode(), password.encode())
+        if ok and self.needs_rehash(stored):
+            with self._lock:
+                self._rehashed += 1
+            return True, self._hash(password)
+        return ok, None
+
+    def _timed(self, fn, *args, jobs=1):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._jobs += jobs
+                self._time_total += elapsed
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HasherBusy(self.retry_after())
+        try:
+            future = self._pool().submit(self._timed, fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def _pool(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    def retry_after(self):
+        # Time for the workers to get through a full queue.
+        with self._lock:
+            average = self._time_total / self._jobs if self._jobs else 0.0
+        return max(1, math.ceil(average * (self.workers + self.queue_size) / self.workers))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "iterations": self.iterations,
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "jobs": self._jobs,
+                "rejected": self._rejected,
+                "rehashed": self._rehashed,
+                "time_avg": round(self._time_total / self._jobs, 6) if self._jobs else 0.0,
+            }
@@ -1,23 +1,26 @@
 from flask import Flask
-from flask_mysqldb import MySQL
 from faker import Faker
+import os
 import random
 from datetime import datetime, timedelta
 
+from storage import create_storage
+
 app = Flask(__name__)
+app.config["DATABASE_URL"] = os.environ.get("DATABASE_URL", "")
 app.config["MYSQL_HOST"] = "127.0.0.1"
 app.config["MYSQL_USER"] = "root"
 app.config["MYSQL_PASSWORD"] = "root"
 app.config["MYSQL_DB"] = "CustomerManagementSystem"
 app.config["MYSQL_CURSORCLASS"] = "DictCursor"
 
-mysql = MySQL(app)
+db = create_storage(app)
 fake = Faker()
 
 # Function to generate fake people data
 def generate_people():
     # Fetch all country names and role names
-    cursor = mysql.connection.cursor()
+    cursor = db.connection.cursor()
     cursor.execute("SELECT Country_Name FROM Countries")
     country_names = [row['Country_Name'] for row in cursor.fetchall()]
 
@@ -73,7 +76,7 @@ def generate_permission_levels():
 
 def generate_internal_messages():
     # Get all existing Person_IDs
-    cursor = mysql.connection.cursor()
+    cursor = db.connection.cursor()
     cursor.execute("SELECT Person_ID FROM People")
     person_ids = [row['Person_ID'] for row in cursor.fetchall()]
     cursor.close()
@@ -98,7 +101,7 @@ def generate_internal_messages():
 
 # Function to insert internal messages data into the database
 def insert_data():
-    db_connection = mysql.connection
+    db_connection = db.connection
     cursor = db_connection.cursor()
 
     # Insert Internal Messages
@@ -109,7 +112,7 @@ def insert_data():
                 INSERT INTO Internal_Messages (Msg_From_Person_ID, Msg_To_Person_ID, Date_Message_Sent, Message_Subject, Message_Text)
                 VALUES (%s, %s, %s, %s, %s)
             """, message)
-        except mysql.connection.IntegrityError as e:
+        except db_connection.IntegrityError as e:
             print(f"Error inserting message: {e}")
 
     # Commit the transaction
@@ -118,7 +121,7 @@ def insert_data():
 
 def generate_payments():
     # Get all existing Person_IDs
-    cursor = mysql.connection.cursor()
+    cursor = db.connection.cursor()
     cursor.execute("SELECT Person_ID FROM People")
     person_ids = [row['Person_ID'] for row in cursor.fetchall()]
     cursor.close()
@@ -147,7 +150,7 @@ def generate_payments():
 
 # Function to insert payments data into the database
 def insert_data():
-    db_connection = mysql.connection
+    db_connection = db.connection
     cursor = db_connection.cursor()
 
     # Insert Payments
@@ -158,7 +161,7 @@ def insert_data():
                 INSERT INTO Payments (Person_ID, Amount_Due, Reminder_Sent_YN, Date_Reminder_Sent, Date_Paid, Other_Details)
                 VALUES (%s, %s, %s, %s, %s, %s)
             """, payment)
-        except mysql.connection.IntegrityError as e:
+        except db_connection.IntegrityError as e:
             print(f"Error inserting payment: {e}")
 
     # Commit the transaction
@@ -167,7 +170,7 @@ def insert_data():
 
 def generate_monthly_reports():
     # Get all existing Person_IDs
-    cursor = mysql.connection.cursor()
+    cursor = db.connection.cursor()
     cursor.execute("SELECT Person_ID FROM People")
     person_ids = [row['Person_ID'] for row in cursor.fetchall()]
     cursor.close()
@@ -186,7 +189,7 @@ def generate_monthly_reports():
 
 # Function to insert monthly reports data into the database
 def insert_data():
-    db_connection = mysql.connection
+    db_connection = db.connection
     cursor = db_connection.cursor()
 
     # Insert Monthly Reports
@@ -197,7 +200,7 @@ def insert_data():
                 INSERT INTO Monthly_Reports (Person_ID, Date_Report_Sent, Report_Text)
                 VALUES (%s, %s, %s)
             """, report)
-        except mysql.connection.IntegrityError as e:
+        except db_connection.IntegrityError as e:
             print(f"Error inserting report: {e}")
 
     # Commit the transaction
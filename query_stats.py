@@ -0,0 +1,214 @@
+import bisect
+import logging
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+
+from flask import has_request_context, request
+
+slow_log = logging.getLogger("cms.slow_queries")
+
+# Upper bounds of the latency histogram buckets, in milliseconds.
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """Normalize ``sql`` so statements differing only in values group together.
+
+    Literals and placeholders become ``?`` and IN lists of any length become
+    ``IN (...)``.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _IN_LIST.sub("IN (...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+class _Entry:
+    __slots__ = ("calls", "rows", "execute_time", "fetch_time", "max_time", "buckets", "routes")
+
+    def __init__(self):
+        self.calls = 0
+        self.rows = 0
+        self.execute_time = 0.0
+        self.fetch_time = 0.0
+        self.max_time = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.routes = {}
+
+    def percentile(self, q):
+        # Upper bound of the bucket holding the q-th call; exact enough to rank queries.
+        wanted = q * self.calls
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= wanted:
+                return bound
+        return self.max_time * 1000
+
+    def summary(self, fingerprint):
+        total = self.execute_time + self.fetch_time
+        return {
+            "fingerprint": fingerprint,
+            "calls": self.calls,
+            "rows": self.rows,
+            "total_ms": round(total * 1000, 3),
+            "avg_ms": round(total * 1000 / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_time * 1000, 3),
+            "execute_ms": round(self.execute_time * 1000, 3),
+            "fetch_ms": round(self.fetch_time * 1000, 3),
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "routes": dict(self.routes),
+        }
+
+
+class QueryStats:
+    """Per-fingerprint query counters and latency histograms, kept in memory.
+
+    The histogram is of execute time, which for buffered cursors includes
+    reading the result off the wire; fetch time is kept as a total. A query
+    taking at least ``slow_threshold`` seconds (execute plus fetch) is
+    written to the ``cms.slow_queries`` log with probability ``slow_sample``.
+    """
+
+    SORT_KEYS = ("total_ms", "avg_ms", "max_ms", "calls", "rows", "p95_ms")
+
+    def __init__(self, enabled=True, slow_threshold=0.2, slow_sample=1.0):
+        self.enabled = enabled
+        self.slow_threshold = slow_threshold
+        self.slow_sample = slow_sample
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, cursor, server="primary"):
+        if not self.enabled:
+            return cursor
+        return TimedCursor(cursor, self, server)
+
+    def record_execute(self, fingerprint, route, elapsed, rows):
+        index = bisect.bisect_left(BUCKETS_MS, elapsed * 1000)
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                entry = self._entries[fingerprint] = _Entry()
+            entry.calls += 1
+            entry.rows += rows
+            entry.execute_time += elapsed
+            entry.buckets[index] += 1
+            if elapsed > entry.max_time:
+                entry.max_time = elapsed
+            entry.routes[route] = entry.routes.get(route, 0) + 1
+
+    def record_fetch(self, fingerprint, elapsed, rows):
+        with self._lock:
+            entry = self._entries[fingerprint]
+            entry.rows += rows
+            entry.fetch_time += elapsed
+
+    def log_slow(self, fingerprint, route, server, execute_time, fetch_time, rows):
+        if self.slow_sample < 1.0 and random.random() >= self.slow_sample:
+            return
+        slow_log.warning(
+            "slow query %.1f ms (execute %.1f ms, fetch %.1f ms, %d rows) route=%s server=%s: %s",
+            (execute_time + fetch_time) * 1000, execute_time * 1000, fetch_time * 1000, rows,
+            route, server, fingerprint,
+        )
+
+    def top(self, limit=10, sort="total_ms"):
+        with self._lock:
+            summaries = [entry.summary(fp) for fp, entry in self._entries.items()]
+        summaries.sort(key=lambda summary: summary[sort], reverse=True)
+        return summaries[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TimedCursor:
+    """DB-API cursor wrapper that times execute and fetch calls into a QueryStats."""
+
+    __slots__ = ("_cursor", "_stats", "_server", "_fingerprint", "_route", "_execute_time",
+                 "_fetch_time", "_rows", "_logged")
+
+    def __init__(self, cursor, stats, server):
+        self._cursor = cursor
+        self._stats = stats
+        self._server = server
+        self._fingerprint = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def _timed_execute(self, method, sql, params):
+        start = time.perf_counter()
+        result = method(sql, params)
+        elapsed = time.perf_counter() - start
+        cur = self._cursor
+        # Writes have no result set; count the rows they touched instead.
+        rows = max(cur.rowcount, 0) if cur.description is None else 0
+        self._fingerprint = fingerprint(sql)
+        self._route = (request.endpoint if has_request_context() else None) or "-"
+        self._execute_time = elapsed
+        self._fetch_time = 0.0
+        self._rows = rows
+        self._logged = False
+        self._stats.record_execute(self._fingerprint, self._route, elapsed, rows)
+        self._check_slow()
+        return result
+
+    def execute(self, sql, params=None):
+        return self._timed_execute(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._timed_execute(self._cursor.executemany, sql, seq_of_params)
+
+    def _fetched(self, elapsed, rows):
+        if self._fingerprint is None:
+            return
+        self._fetch_time += elapsed
+        self._rows += rows
+        self._stats.record_fetch(self._fingerprint, elapsed, rows)
+        self._check_slow()
+
+    def _check_slow(self):
+        if not self._logged and self._execute_time + self._fetch_time >= self._stats.slow_threshold:
+            self._logged = True
+            self._stats.log_slow(self._fingerprint, self._route, self._server,
+                                 self._execute_time, self._fetch_time, self._rows)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(time.perf_counter() - start, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = self._cursor.fetchmany(size) if size is not None else self._cursor.fetchmany()
+        self._fetched(time.perf_counter() - start, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(time.perf_counter() - start, len(rows))
+        return rows
+
+    def close(self):
+        self._cursor.close()
@@ -0,0 +1,176 @@
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask import jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+
+class MemoryBackend:
+    """Token buckets for one process.
+
+    Each key holds ``[tokens, updated_at]``. Keys are kept in order of last
+    use, so the ones idle long enough to be full again (and so no different
+    from a missing key) are swept from the front.
+    """
+
+    def __init__(self):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period, max_period):
+        now = time.monotonic()
+        rate = capacity / period
+        with self._lock:
+            self._sweep(now - max_period)
+            bucket = self._buckets.pop(key, None)
+            if bucket is None:
+                bucket = [capacity, now]
+            else:
+                bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            self._buckets[key] = bucket
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return True, 0.0
+            return False, (1 - bucket[0]) / rate
+
+    def _sweep(self, cutoff):
+        buckets = self._buckets
+        while buckets:
+            key, (_, updated_at) = next(iter(buckets.items()))
+            if updated_at > cutoff:
+                break
+            del buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteBackend:
+    """Token buckets in a SQLite file, shared by every worker process on a host."""
+
+    SWEEP_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        with self._connection() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS rate_limit_buckets "
+                         "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")
+        return conn
+
+    def take(self, key, capacity, period, max_period):
+        # Wall clock time, since the buckets are shared between processes.
+        now = time.time()
+        rate = capacity / period
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._calls += 1
+            if self._calls % self.SWEEP_EVERY == 0:
+                conn.execute("DELETE FROM rate_limit_buckets WHERE updated_at <= ?", (now - max_period,))
+            row = conn.execute("SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM rate_limit_buckets").fetchone()[0]
+
+    def reset(self):
+        self._connection().execute("DELETE FROM rate_limit_buckets")
+
+
+class RateLimiter:
+    """Token bucket rate limiting, checked before any view runs.
+
+    Each request falls in a route class: the one RATE_LIMIT_CLASSES maps its
+    endpoint to, else ``read`` for GET/HEAD and ``write`` for the rest.
+    RATE_LIMITS gives each class ``(requests, seconds)``. Buckets are keyed by
+    class and the JWT identity when a valid token is sent, or the client IP
+    otherwise. Requests over the limit get a 429 with Retry-After before the
+    view, and so the database, is reached.
+
+    RATE_LIMIT_STORAGE is ``memory`` (per process) or ``sqlite:///path`` to
+    share the buckets between the worker processes on one host.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self._rejected = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("RATE_LIMIT_ENABLED", True)
+        app.config.setdefault("RATE_LIMITS", {"login": (10, 60), "write": (120, 60), "read": (1200, 60)})
+        app.config.setdefault("RATE_LIMIT_CLASSES", {"login_user": "login"})
+        app.config.setdefault("RATE_LIMIT_STORAGE", "memory")
+        storage = app.config["RATE_LIMIT_STORAGE"]
+        if storage.startswith("sqlite:///"):
+            self.backend = SQLiteBackend(storage[len("sqlite:///"):])
+        else:
+            self.backend = MemoryBackend()
+        self.config = app.config
+        app.before_request(self.check)
+
+    def route_class(self):
+        route_class = self.config["RATE_LIMIT_CLASSES"].get(request.endpoint)
+        if route_class is None:
+            route_class = "read" if request.method in ("GET", "HEAD", "OPTIONS") else "write"
+        return route_class
+
+    def client_key(self):
+        try:
+            # Only decodes and checks the token; no database involved.
+            if verify_jwt_in_request(optional=True):
+                return f"user:{get_jwt_identity()}"
+        except Exception:
+            pass
+        return f"ip:{request.remote_addr}"
+
+    def check(self):
+        if not self.config["RATE_LIMIT_ENABLED"]:
+            return None
+        limits = self.config["RATE_LIMITS"]
+        route_class = self.route_class()
+        if route_class not in limits:
+            return None
+        capacity, period = limits[route_class]
+        max_period = max(seconds for _, seconds in limits.values())
+        allowed, retry_after = self.backend.take(f"{route_class}:{self.client_key()}", capacity, period, max_period)
+        if allowed:
+            return None
+        self._rejected += 1
+        response = make_response(jsonify({"error": "Too many requests"}), 429)
+        response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    def reset(self):
+        self.backend.reset()
+
+    def stats(self):
+        return {"keys": len(self.backend), "rejected": self._rejected}
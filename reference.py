@@ -0,0 +1,139 @@
+import threading
+import time
+from types import MappingProxyType
+
+from flask import current_app
+
+# name -> (table, key column) of the small tables kept in memory, per dialect.
+REFERENCE_TABLES = {
+    "mysql": {
+        "permission_levels": ("permission_Levels", "Permission_Level_Code"),
+    },
+    "sqlite": {
+        "permission_levels": ("Permission_Levels", "Permission_Level_Code"),
+        "countries": ("Countries", "Country_Name"),
+        "roles": ("Roles", "Role_Description"),
+    },
+}
+
+# Person fields that must name a row of a reference table. Only the SQLite
+# schema has these foreign keys; the MySQL people table stores free text.
+PERSON_REFERENCES = {
+    "mysql": {},
+    "sqlite": {
+        "Permission_Level_Code": "permission_levels",
+        "Country_Name": "countries",
+        "Role_Description": "roles",
+    },
+}
+
+
+class Snapshot:
+    """The rows of a reference table at one version, never modified once built.
+
+    ``by_key`` maps the key column to its row and ``body`` is the JSON list
+    response, serialized once.
+    """
+
+    __slots__ = ("rows", "by_key", "body", "stamp")
+
+    def __init__(self, rows, key, body, stamp):
+        self.rows = tuple(rows)
+        self.by_key = MappingProxyType({row[key]: row for row in self.rows})
+        self.body = body
+        self.stamp = stamp
+
+
+class ReferenceData:
+    """In-process snapshots of the reference tables.
+
+    A snapshot is used while the table's version (see versions.py) is the
+    one it was taken at, so writes through another process are picked up
+    when the versions are shared. Write handlers swap in a new snapshot
+    themselves; readers only ever see a whole old or a whole new one.
+    """
+
+    def __init__(self, get_storage, versions):
+        self.get_storage = get_storage
+        self.versions = versions
+        self._snapshots = {}
+        self._lock = threading.RLock()
+        self._loads = 0
+
+    def tables(self):
+        return REFERENCE_TABLES[self.get_storage().dialect]
+
+    def person_references(self):
+        return PERSON_REFERENCES[self.get_storage().dialect]
+
+    def get(self, name):
+        snapshot = self._snapshots.get(name)
+        stamp = self.versions.stamp(name)
+        if snapshot is None or snapshot.stamp != stamp:
+            snapshot = self._load(name, stamp)
+        return snapshot
+
+    def load_all(self):
+        for name in self.tables():
+            self.get(name)
+
+    def add(self, name, row):
+        """Swap in a snapshot with ``row`` added, after the handler committed it."""
+        _, key = self.tables()[name]
+        with self._lock:
+            rows = sorted([*self.get(name).rows, row], key=lambda item: item[key])
+            self._store(name, rows, self._next_stamp(name))
+
+    def reload(self, name):
+        """Swap in a snapshot read through this context's write connection, after a commit."""
+        with self._lock:
+            self._store(name, self._select(name, write=True), self._next_stamp(name))
+
+    def clear(self):
+        self._snapshots = {}
+
+    def _next_stamp(self, name):
+        # The handler's @bumps_version moves the table to the next version
+        # once it returns; this snapshot holds that version's rows.
+        epoch, version = self.versions.stamp(name)
+        return epoch, version + 1
+
+    def _select(self, name, write=False):
+        storage = self.get_storage()
+        table, key = self.tables()[name]
+        resource = storage.resources.get(name)
+        if resource is not None:
+            # Same columns as the list endpoint, so the body matches it.
+            query = f"SELECT {resource.select_list()} FROM {resource.source} ORDER BY {resource.expr(resource.pk)}"
+        else:
+            query = f"SELECT * FROM {table} ORDER BY {key}"
+        cur = storage.cursor(write=write)
+        cur.execute(query)
+        rows = list(cur.fetchall())
+        cur.close()
+        return rows
+
+    def _load(self, name, stamp):
+        rows = self._select(name)
+        _, changed_at = self.versions.get(name)
+        if time.time() - changed_at < self.get_storage().max_read_lag():
+            # Read from a replica that may not have the latest change; use it once.
+            return self._snapshot(name, rows, None)
+        with self._lock:
+            self._loads += 1
+            return self._store(name, rows, stamp)
+
+    def _snapshot(self, name, rows, stamp):
+        _, key = self.tables()[name]
+        return Snapshot(rows, key, current_app.json.rows_response(rows).get_data(), stamp)
+
+    def _store(self, name, rows, stamp):
+        snapshot = self._snapshot(name, rows, stamp)
+        self._snapshots = {**self._snapshots, name: snapshot}
+        return snapshot
+
+    def stats(self):
+        return {
+            "tables": {name: len(snapshot.rows) for name, snapshot in self._snapshots.items()},
+            "loads": self._loads,
+        }
@@ -0,0 +1,125 @@
+import threading
+
+
+class Statement:
+    """A named SQL statement, already in the driver's placeholder style."""
+
+    __slots__ = ("name", "sql")
+
+    def __init__(self, name, sql):
+        self.name = name
+        self.sql = sql
+
+    def __repr__(self):
+        return f"Statement({self.name!r})"
+
+
+def _statement_sources(resources):
+    people = resources["people"]
+    person_fields = ["Permission_Level_Code", "Login_Name", "Password", "Personal_Details",
+                     "Other_Details", "Country_Name", "Role_Description"]
+    sources = {
+        "permission_levels.by_code":
+            "SELECT * FROM permission_Levels WHERE Permission_Level_Code = %s",
+        "permission_levels.insert":
+            "INSERT INTO permission_Levels (Permission_Level_Code, Permission_Level_Description) VALUES (%s, %s)",
+        "permission_levels.update":
+            "UPDATE permission_Levels SET Permission_Level_Description = %s WHERE Permission_Level_ID = %s",
+        "permission_levels.delete":
+            "DELETE FROM permission_Levels WHERE Permission_Level_ID = %s",
+        "people.by_login": people.lookup_sql("Login_Name"),
+        "people.identity_by_login": people.lookup_sql(
+            "Login_Name", ["Person_ID", "Role_Description", "Permission_Level_Code", "Password"]),
+        "people.insert": people.insert_sql(person_fields),
+        "people.delete": "DELETE FROM people WHERE Person_ID = %s",
+        "internal_messages.insert":
+            "INSERT INTO internal_Messages (msg_from_person_id, msg_to_person_id, date_message_sent, "
+            "message_subject, message_text) VALUES (%s, %s, %s, %s, %s)",
+        "internal_messages.update":
+            "UPDATE internal_Messages SET Message_Content = %s, Sender = %s, Recipient = %s, Date_Sent = %s "
+            "WHERE Message_ID = %s",
+        "internal_messages.delete": "DELETE FROM internal_Messages WHERE Message_ID = %s",
+        "payments.insert":
+            "INSERT INTO payments (Amount, Payment_Date, Payment_Method) VALUES (%s, %s, %s)",
+        "payments.update":
+            "UPDATE payments SET Amount = %s, Payment_Date = %s, Payment_Method = %s WHERE Payment_ID = %s",
+        "payments.delete": "DELETE FROM payments WHERE Payment_ID = %s",
+        "monthly_reports.insert":
+            "INSERT INTO monthly_Reports (Person_ID, Date_Report_Sent, Report_Text) VALUES (%s, %s, %s)",
+        "monthly_reports.update":
+            "UPDATE monthly_Reports SET Report_Title = %s, Report_Date = %s, Report_Content = %s "
+            "WHERE Report_ID = %s",
+        "monthly_reports.delete": "DELETE FROM monthly_Reports WHERE Report_ID = %s",
+    }
+    # Primary key lookups for every resource.
+    for name, resource in resources.items():
+        sources[f"{name}.by_id"] = resource.lookup_sql(resource.pk)
+    return sources
+
+
+class StatementRegistry:
+    """Named statements for one storage backend, built once at startup.
+
+    ``placeholder`` replaces the ``%s`` markers the SQL is written with, so
+    drivers using another paramstyle get their final text up front. UPDATEs
+    that set a variable set of columns are built on first use and cached by
+    a bitmap of the resource columns they set; multi-row upserts are cached
+    by row count.
+    """
+
+    def __init__(self, resources, placeholder="%s", dialect="mysql"):
+        self.resources = resources
+        self.placeholder = placeholder
+        self.dialect = dialect
+        self._statements = {
+            name: self._compile(name, sql) for name, sql in _statement_sources(resources).items()
+        }
+        self._updates = {}
+        self._lock = threading.Lock()
+
+    def _compile(self, name, sql):
+        if self.placeholder != "%s":
+            sql = sql.replace("%s", self.placeholder)
+        return Statement(name, sql)
+
+    def __getitem__(self, name):
+        return self._statements[name]
+
+    def __contains__(self, name):
+        return name in self._statements
+
+    def __len__(self):
+        return len(self._statements)
+
+    def update(self, resource_name, values):
+        """Build ``UPDATE ... WHERE pk = %s`` for the columns in ``values``.
+
+        Returns ``(statement, params)``; the caller appends the primary key
+        to ``params``. Columns are laid out in resource order so every
+        ordering of the same set shares one cached statement.
+        """
+        resource = self.resources[resource_name]
+        columns = [column for column in resource.columns if column in values]
+        bitmap = 0
+        for column in columns:
+            bitmap |= 1 << resource.columns.index(column)
+        key = (resource_name, bitmap)
+        statement = self._updates.get(key)
+        if statement is None:
+            statement = self._compile(f"{resource_name}.update#{bitmap:x}", resource.update_sql(columns))
+            with self._lock:
+                statement = self._updates.setdefault(key, statement)
+        return statement, [values[column] for column in columns]
+
+    def upsert(self, resource_name, rows):
+        """INSERT of ``rows`` full rows (primary key first, in resource column
+        order) that updates rows whose primary key already exists."""
+        key = (resource_name, "upsert", rows)
+        statement = self._updates.get(key)
+        if statement is None:
+            resource = self.resources[resource_name]
+            sql = resource.upsert_sql(resource.columns, rows, self.dialect)
+            statement = self._compile(f"{resource_name}.upsert#{rows}", sql)
+            with self._lock:
+                statement = self._updates.setdefault(key, statement)
+        return statement
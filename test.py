@@ -1,9 +1,35 @@
+import csv
+import datetime
+import decimal
+import gzip
+import io
+import json
+import shutil
+import sqlite3
+import threading
+import time
+import zlib
+
 import pytest
 from flask import Flask
 from flask.testing import FlaskClient
 from unittest.mock import MagicMock, patch
+from flask_jwt_extended import create_access_token
 from werkzeug.exceptions import BadRequest
-from api import app, data_fetch
+from werkzeug.security import check_password_hash
+from api import (app, csv_value, data_fetch, identity_cache, limiter, reference_data, row_cache, row_fragments,
+                 table_versions)
+from cli import TABLE_GROUPS
+from cache import IdentityCache
+from passwords import HasherBusy, PasswordHasher, is_hash
+from rate_limit import MemoryBackend, SQLiteBackend
+from versions import SQLiteVersions
+from db_pool import ConnectionPool, PoolTimeout
+from storage import MySQLStorage, SQLiteStorage, Storage
+from statements import StatementRegistry
+from query_stats import fingerprint
+from json_provider import RowJSONProvider
+from listing import RESOURCES, SQLITE_RESOURCES, decode_cursor, encode_cursor, parse_filter
 
 @pytest.fixture
 def client():
@@ -12,9 +38,49 @@ def client():
     app.config["MYSQL_USER"] = "mock_user"
     app.config["MYSQL_PASSWORD"] = "mock_password"
     app.config["MYSQL_DB"] = "mock_db"
-    with app.test_client() as client:
+    identity_cache.clear()
+    limiter.reset()
+    table_versions.reset()
+    reference_data.clear()
+    row_fragments.clear()
+    row_cache.clear()
+    # A low cost factor keeps the tests fast.
+    with patch('api.hasher', PasswordHasher(iterations=1000, workers=2)), app.test_client() as client:
         yield client
 
+class MockStorage(Storage):
+    """Storage whose connections are all the same mock connection."""
+
+    dialect = "mysql"
+
+    def __init__(self, connection):
+        self.mock_connection = connection
+        super().__init__()
+
+    def acquire(self, write):
+        return self.mock_connection
+
+    def release(self, conn, write, discard=False):
+        pass
+
+    def _server_side_cursor(self, tuples=False):
+        return self.read_connection.cursor()
+
+    def _tuple_cursor(self, conn):
+        return TupleCursor(conn.cursor())
+
+class TupleCursor:
+    """The mock cursor with its dict rows handed out as tuples, like a tuple cursor's."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def fetchall(self):
+        return [tuple(row.values()) for row in self.cursor.fetchall()]
+
 @pytest.fixture
 def mock_db(mocker):
     # Create a mock cursor
@@ -24,12 +90,8 @@ def mock_db(mocker):
     mock_connection = MagicMock()
     mock_connection.cursor.return_value = mock_cursor
     
-    # Create a mock MySQL instance
-    mock_mysql = MagicMock()
-    mock_mysql.connection = mock_connection
-    
-    # Patch the MySQL instance in your application
-    with patch('api.mysql', mock_mysql):
+    # Patch the storage instance in your application
+    with patch('api.db', MockStorage(mock_connection)):
         yield mock_cursor
 
 # Basic Route Tests
@@ -184,4 +246,1042 @@ def test_update_monthly_report_not_found(client: FlaskClient, mock_db):
     }
     response = client.put("/monthly_reports/999", json=data)  # Non-existent ID
     assert response.status_code == 404
-    assert "Monthly report not found" in response.get_data(as_text=True)
\ No newline at end of file
+    assert "Monthly report not found" in response.get_data(as_text=True)
+
+# Streaming Tests
+def test_get_payments_stream_json_array(client: FlaskClient, mock_db):
+    mock_db.fetchmany.side_effect = [
+        [{"Payment_ID": 1}, {"Payment_ID": 2}],
+        [{"Payment_ID": 3}],
+        [],
+    ]
+    response = client.get("/payments?stream=1")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.get_json() == [{"Payment_ID": 1}, {"Payment_ID": 2}, {"Payment_ID": 3}]
+    mock_db.close.assert_called_once()
+
+def test_get_internal_messages_stream_ndjson(client: FlaskClient, mock_db):
+    mock_db.fetchmany.side_effect = [[{"Message_ID": 1}, {"Message_ID": 2}], []]
+    response = client.get("/internal_messages", headers={"Accept": "application/x-ndjson"})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.get_data(as_text=True) == '{"Message_ID":1}\n{"Message_ID":2}\n'
+
+def test_get_people_stream_empty(client: FlaskClient, mock_db):
+    mock_db.fetchmany.return_value = []
+    response = client.get("/people?stream=1")
+    assert response.get_json() == {"people": []}
+
+
+# Connection Pool Tests
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+        self.alive = True
+
+    def ping(self):
+        if not self.alive:
+            raise Exception("MySQL server has gone away")
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+def test_pool_warm_up_and_reuse():
+    pool = ConnectionPool(FakeConnection, min_size=2, max_size=4)
+    pool.warm_up()
+    assert pool.stats()["idle"] == 2
+
+    conn = pool.acquire()
+    pool.release(conn)
+    assert pool.acquire() is conn
+    assert pool.stats()["created"] == 2
+    assert pool.stats()["in_use"] == 1
+
+def test_pool_checkout_timeout():
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1, timeout=0.05)
+    pool.acquire()
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()["timeouts"] == 1
+
+def test_pool_replaces_dead_connection():
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1, ping_after=0)
+    conn = pool.acquire()
+    pool.release(conn)
+    conn.alive = False
+    replacement = pool.acquire()
+    assert replacement is not conn
+    assert conn.closed
+    assert pool.stats()["replaced"] == 1
+
+def test_pool_evicts_idle_connections():
+    pool = ConnectionPool(FakeConnection, min_size=1, max_size=3, idle_timeout=0)
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    pool.release(second)
+    pool.release(pool.acquire())
+    assert pool.stats()["size"] == 1
+    assert first.closed
+
+def test_mysql_read_connections_pass_values_through():
+    storage = MySQLStorage()
+    storage.config = {"MYSQL_DRIVER": "mysqlclient", "MYSQL_READ_PASSTHROUGH": True}
+    conn = FakeConnection()
+    # What mysqlclient sets up per connection: VARCHAR (15) and VAR_STRING (253)
+    # decoded to str, NEWDECIMAL (246) to Decimal, DATETIME (12) parsed.
+    conn.converter = typed = {15: str, 253: str, 246: decimal.Decimal, 12: datetime.datetime.fromisoformat}
+    storage.pool = ConnectionPool(lambda: conn, min_size=0, max_size=1)
+    raw = storage.acquire(write=False).converter
+    assert raw[15] is str and raw[253] is str
+    assert raw[246] is str and raw[12] is str
+    storage.release(conn, write=False)
+    assert storage.acquire(write=True).converter is typed
+    storage.release(conn, write=True)
+    assert storage.acquire(write=False).converter is raw
+    storage.release(conn, write=False)
+    storage.config["MYSQL_READ_PASSTHROUGH"] = False
+    assert storage.acquire(write=False).converter is typed
+
+
+# Pagination Tests
+def test_get_payments_first_page(client: FlaskClient, mock_db):
+    mock_db.fetchall.return_value = [{"Payment_ID": 1}, {"Payment_ID": 2}, {"Payment_ID": 3}]
+    response = client.get("/payments?limit=2")
+    assert response.status_code == 200
+    assert response.get_json() == [{"Payment_ID": 1}, {"Payment_ID": 2}]
+    assert decode_cursor(response.headers["X-Next-Cursor"], 1) == [2]
+    assert 'rel="next"' in response.headers["Link"]
+
+    # The page's keys, then the rows not in the fragment cache
+    query, params = mock_db.execute.call_args_list[0][0]
+    assert "ORDER BY Payment_ID LIMIT %s" in query
+    assert params == [3]
+    query, params = mock_db.execute.call_args_list[1][0]
+    assert query.endswith("WHERE Payment_ID IN (%s, %s)")
+    assert params == [1, 2]
+
+def test_get_payments_last_page_has_no_cursor(client: FlaskClient, mock_db):
+    mock_db.fetchall.return_value = [{"Payment_ID": 1}]
+    response = client.get("/payments?limit=2")
+    assert "X-Next-Cursor" not in response.headers
+
+def test_get_messages_seek_with_sort_key(client: FlaskClient, mock_db):
+    mock_db.fetchall.return_value = []
+    cursor = encode_cursor(["2024-01-01 10:00:00", 7])
+    response = client.get(f"/internal_messages?sort=-Date_Message_Sent&after={cursor}")
+    assert response.status_code == 200
+
+    query, params = mock_db.execute.call_args[0]
+    assert "(Date_Message_Sent < %s OR (Date_Message_Sent = %s AND Message_ID < %s))" in query
+    assert "ORDER BY Date_Message_Sent DESC, Message_ID DESC" in query
+    assert params == ["2024-01-01 10:00:00", "2024-01-01 10:00:00", 7, 101]
+
+def test_page_size_is_capped(client: FlaskClient, mock_db):
+    mock_db.fetchall.return_value = []
+    client.get("/people?limit=100000")
+    assert mock_db.execute.call_args[0][1] == [app.config["PAGE_SIZE_MAX"] + 1]
+
+def test_invalid_pagination_arguments(client: FlaskClient, mock_db):
+    assert client.get("/payments?limit=abc").status_code == 400
+    assert client.get("/payments?sort=Other_Details").status_code == 400
+    assert client.get("/payments?after=not-a-cursor").status_code == 400
+
+
+# Field Projection Tests
+def test_fields_narrow_the_select_list(client: FlaskClient, mock_db):
+    mock_db.fetchall.return_value = [{"Message_ID": 1, "Date_Message_Sent": "2024-01-01 10:00:00"}]
+    response = client.get("/internal_messages?fields=Date_Message_Sent")
+    assert response.status_code == 200
+    query = mock_db.execute.call_args[0][0]
+    assert query.startswith("SELECT Message_ID, Date_Message_Sent FROM internal_Messages")
+    assert "Message_Text" not in query
+
+def test_fields_include_sort_key(client: FlaskClient, mock_db):
+    mock_db.fetchall.return_value = []
+    client.get("/payments?fields=Person_ID&sort=Amount_Due")
+    query = mock_db.execute.call_args[0][0]
+    assert query.startswith("SELECT Payment_ID, Person_ID, Amount_Due FROM payments")
+
+def test_unknown_field_rejected(client: FlaskClient, mock_db):
+    response = client.get("/people?fields=Login_Name,Salary")
+    assert response.status_code == 400
+    assert "Salary" in response.get_json()["error"]
+
+
+# Filter Tests
+def test_filters_compile_to_parameterized_where(client: FlaskClient, mock_db):
+    mock_db.fetchall.return_value = []
+    response = client.get("/payments?Person_ID=in:1,2&Date_Paid=range:2024-01-01..2024-02-01&limit=10")
+    assert response.status_code == 200
+    query, params = mock_db.execute.call_args[0]
+    assert "WHERE Person_ID IN (%s, %s) AND Date_Paid >= %s AND Date_Paid < %s" in query
+    assert params == ["1", "2", "2024-01-01", "2024-02-01", 11]
+
+def test_filters_combine_with_seek(client: FlaskClient, mock_db):
+    mock_db.fetchall.return_value = []
+    client.get(f"/internal_messages?Msg_To_Person_ID=3&after={encode_cursor([40])}")
+    query, params = mock_db.execute.call_args[0]
+    assert "WHERE Msg_To_Person_ID = %s AND Message_ID > %s" in query
+    assert params[:2] == ["3", 40]
+
+def test_filter_operators():
+    assert parse_filter("Date_Paid", "null:true") == ("Date_Paid IS NULL", [])
+    assert parse_filter("Date_Paid", "range:..2024-01-01") == ("Date_Paid < %s", ["2024-01-01"])
+    assert parse_filter("Login_Name", "prefix:a_b") == ("Login_Name LIKE %s ESCAPE '!'", ["a!_b%"])
+    with pytest.raises(BadRequest):
+        parse_filter("Date_Paid", "null:maybe")
+
+def test_unindexed_filter_needs_flag(client: FlaskClient, mock_db):
+    mock_db.fetchall.return_value = []
+    assert client.get("/payments?Reminder_Sent_YN=Y").status_code == 400
+    app.config["FILTER_ALLOW_UNINDEXED"] = True
+    try:
+        assert client.get("/payments?Reminder_Sent_YN=Y").status_code == 200
+    finally:
+        app.config["FILTER_ALLOW_UNINDEXED"] = False
+
+
+# SQLite Storage Tests
+@pytest.fixture
+def sqlite_db(tmp_path):
+    path = tmp_path / "cms.db"
+    shutil.copy("CustomerManagementSystem.db", path)
+    storage = SQLiteStorage(app, path=str(path))
+    with patch('api.db', storage):
+        yield storage
+
+def test_sqlite_get_people_maps_codes_to_names(client: FlaskClient, sqlite_db):
+    response = client.get("/people?limit=2&fields=Login_Name,Country_Name,Role_Description")
+    assert response.status_code == 200
+    people = response.get_json()["people"]
+    assert len(people) == 2
+    assert people[0]["Country_Name"] == "Australia"
+    assert people[0]["Role_Description"] == "User"
+    assert "X-Next-Cursor" in response.headers
+
+def test_sqlite_person_round_trip(client: FlaskClient, sqlite_db):
+    person_data = {
+        "Permission_Level_Code": "LOW",
+        "Login_Name": "sqliteuser",
+        "Password": "password123",
+        "Personal_Details": "Test User",
+        "Other_Details": "None",
+        "Country_Name": "Canada",
+        "Role_Description": "Moderator"
+    }
+    assert client.post("/people", json=person_data).status_code == 201
+
+    response = client.put("/people/76", json={"Country_Name": "India"})
+    assert response.status_code == 200
+
+    people = client.get("/people?Login_Name=sqliteuser").get_json()["people"]
+    assert people[0]["Country_Name"] == "India"
+    assert people[0]["Role_Description"] == "Moderator"
+
+    assert client.delete("/people/76").status_code == 200
+    assert client.delete("/people/76").status_code == 404
+
+def test_sqlite_stream_and_filters(client: FlaskClient, sqlite_db):
+    response = client.get("/payments?stream=ndjson&Person_ID=4")
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines
+    assert all(json.loads(line)["Person_ID"] == 4 for line in lines)
+
+def test_sqlite_limited_streams_send_limit_rows(client: FlaskClient, sqlite_db):
+    assert len(client.get("/payments?stream=1&limit=3").get_json()) == 3
+    assert len(client.get("/payments?stream=ndjson&limit=3").get_data(as_text=True).splitlines()) == 3
+    rows = list(csv.reader(io.StringIO(client.get("/payments?format=csv&limit=3").get_data(as_text=True))))
+    assert len(rows) == 1 + 3  # header
+    assert "X-Next-Cursor" not in client.get("/payments?stream=1&limit=3").headers
+
+def test_sqlite_uses_wal_and_single_writer(sqlite_db):
+    with sqlite_db.session(write=True) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()["journal_mode"] == "wal"
+    with sqlite_db.session(write=False) as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM Payments")
+
+
+# Read Replica Tests
+@pytest.fixture
+def replicated_db(tmp_path):
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+    shutil.copy("CustomerManagementSystem.db", primary)
+    shutil.copy("CustomerManagementSystem.db", replica)
+    app.config["SQLITE_REPLICAS"] = [str(replica)]
+    try:
+        storage = SQLiteStorage(app, path=str(primary))
+    finally:
+        app.config["SQLITE_REPLICAS"] = []
+    with patch('api.db', storage):
+        yield storage
+
+def test_reads_go_to_replica_until_client_writes(replicated_db):
+    # Plain clients: a ``with`` client keeps its app context (and g) alive between requests.
+    client, other = app.test_client(), app.test_client()
+    person_data = {
+        "Permission_Level_Code": "LOW", "Login_Name": "replicauser", "Password": "password123",
+        "Personal_Details": "Test User", "Other_Details": "None",
+        "Country_Name": "Canada", "Role_Description": "Moderator"
+    }
+    response = client.post("/people", json=person_data)
+    assert response.status_code == 201
+    token = response.headers["X-Read-After-Write"]
+
+    # Another client reads from the replica, which has not caught up.
+    assert other.get("/people?Login_Name=replicauser").get_json()["people"] == []
+    # The writer's cookie, or the header, keeps its reads on the primary.
+    assert len(client.get("/people?Login_Name=replicauser").get_json()["people"]) == 1
+    response = other.get("/people?Login_Name=replicauser", headers={"X-Read-After-Write": token})
+    assert len(response.get_json()["people"]) == 1
+    response = other.get("/people?Login_Name=replicauser", headers={"X-Read-After-Write": token + "x"})
+    assert response.get_json()["people"] == []
+
+def test_lagging_replica_is_taken_out_of_rotation(client: FlaskClient, replicated_db):
+    with replicated_db.session() as conn:
+        conn.execute("DELETE FROM Payments WHERE Person_ID = 4")
+        conn.commit()
+    assert client.get("/payments?Person_ID=4").get_json()
+
+    replicated_db.replica_lag = lambda replica: 60.0
+    replicated_db._checked_at = None
+    assert client.get("/payments?Person_ID=4").get_json() == []
+    assert replicated_db.stats()["replicas"][0]["healthy"] is False
+
+
+# Statement Registry Tests
+def test_update_shapes_are_cached_by_column_set():
+    registry = StatementRegistry(RESOURCES)
+    first, values = registry.update("people", {"Password": "b", "Login_Name": "a"})
+    second, _ = registry.update("people", {"Login_Name": "c", "Password": "d"})
+    assert first is second
+    assert first.sql == "UPDATE people SET Login_Name = %s, Password = %s WHERE Person_ID = %s"
+    assert values == ["a", "b"]
+
+def test_sqlite_statements_are_compiled_to_qmark():
+    registry = StatementRegistry(SQLITE_RESOURCES, placeholder="?")
+    assert "%s" not in registry["people.by_login"].sql
+    assert registry["payments.by_id"].sql.endswith("WHERE Payment_ID = ?")
+
+def test_login_uses_registered_statement(client: FlaskClient, mock_db):
+    mock_db.fetchone.return_value = {"Person_ID": 1, "Password": "secret",
+                                     "Role_Description": "User", "Permission_Level_Code": "LOW"}
+    response = client.post("/login", json={"username": "testuser", "password": "secret"})
+    assert response.status_code == 200
+    assert mock_db.execute.call_args_list[0][0][0] == StatementRegistry(RESOURCES)["people.identity_by_login"].sql
+
+
+def test_login_rejects_non_string_credentials(client: FlaskClient, mock_db):
+    mock_db.fetchone.return_value = {"Person_ID": 1, "Password": "secret",
+                                     "Role_Description": "User", "Permission_Level_Code": "LOW"}
+    for body in ({"username": "testuser", "password": 123}, {"username": "testuser", "password": None},
+                 {"username": ["testuser"], "password": "secret"}, ["testuser", "secret"]):
+        assert client.post("/login", json=body).status_code == 400
+    mock_db.execute.assert_not_called()
+
+# Query Timing Tests
+def test_fingerprint_normalizes_values():
+    assert fingerprint("SELECT * FROM people  WHERE Login_Name = 'bob' AND Person_ID IN (%s, %s, %s)") == \
+        "SELECT * FROM people WHERE Login_Name = ? AND Person_ID IN (...)"
+    assert fingerprint("SELECT * FROM payments WHERE Amount_Due > 10.5 LIMIT ?") == \
+        "SELECT * FROM payments WHERE Amount_Due > ? LIMIT ?"
+
+def test_queries_are_timed_per_fingerprint(client: FlaskClient, sqlite_db, caplog):
+    sqlite_db.query_stats.reset()
+    client.get("/payments?Person_ID=4")
+    client.get("/payments?Person_ID=5")
+    top = sqlite_db.query_stats.top(sort="calls")
+    assert top[0]["calls"] == 2
+    assert top[0]["routes"] == {"get_payments": 2}
+    assert top[0]["rows"] > 0
+    assert "Person_ID = ?" in top[0]["fingerprint"]
+
+    sqlite_db.query_stats.slow_threshold = 0
+    try:
+        with caplog.at_level("WARNING", logger="cms.slow_queries"):
+            client.get("/payments?Person_ID=4")
+    finally:
+        sqlite_db.query_stats.slow_threshold = app.config["QUERY_SLOW_MS"] / 1000
+    assert "route=get_payments server=primary" in caplog.text
+
+def manager_headers():
+    with app.app_context():
+        token = create_access_token(identity="manager", additional_claims={
+            "Role_Description": "Manager Role", "Permission_Level_Code": "HIGH"})
+    return {"Authorization": f"Bearer {token}"}
+
+def test_admin_queries_lists_top_statements(client: FlaskClient, mock_db):
+    mock_db.fetchall.return_value = []
+    headers = manager_headers()
+    client.get("/payments?Person_ID=4")
+    response = client.get("/admin/queries?limit=5&sort=calls", headers=headers)
+    assert response.status_code == 200
+    queries = response.get_json()["queries"]
+    assert queries[0]["routes"] == {"get_payments": 1}
+    assert client.get("/admin/queries?sort=bogus", headers=headers).status_code == 400
+
+
+# Token Claims Tests
+def test_login_signs_role_into_token(client: FlaskClient, mock_db):
+    mock_db.fetchone.return_value = {"Person_ID": 2, "Password": "secret",
+                                     "Role_Description": "Manager Role", "Permission_Level_Code": "HIGH"}
+    token = client.post("/login", json={"username": "boss", "password": "secret"}).get_json()["access_token"]
+    mock_db.reset_mock()
+
+    response = client.get("/admin", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    mock_db.execute.assert_not_called()
+
+def test_role_required_checks_claims(client: FlaskClient, mock_db):
+    with app.app_context():
+        user_token = create_access_token(identity="someone", additional_claims={
+            "Role_Description": "User", "Permission_Level_Code": "LOW"})
+        bare_token = create_access_token(identity="someone")
+    assert client.get("/admin", headers={"Authorization": f"Bearer {user_token}"}).status_code == 403
+    assert client.get("/admin", headers={"Authorization": f"Bearer {bare_token}"}).status_code == 401
+    assert client.get("/admin", headers=manager_headers()).status_code == 200
+    mock_db.execute.assert_not_called()
+
+
+# Identity Cache Tests
+def test_identity_cache_lru_and_ttl():
+    cache = IdentityCache(maxsize=2, ttl=60)
+    cache.set("a", {"Person_ID": 1})
+    cache.set("b", {"Person_ID": 2})
+    assert cache.get("a") == {"Person_ID": 1}
+    cache.set("c", {"Person_ID": 3})  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    cache.invalidate_person(1)
+    assert cache.get("a") is None
+    cache.ttl = 0
+    cache.set("d", {"Person_ID": 4})
+    assert cache.get("d") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["invalidations"], stats["expirations"]) == (1, 3, 1, 1, 1)
+
+def test_identity_cache_drops_every_spelling_of_a_login():
+    cache = IdentityCache()
+    row = {"Person_ID": 7}
+    cache.set("alice", row)
+    cache.set("ALICE", row)
+    cache.set("bob", {"Person_ID": 8})
+    cache.invalidate_person(7)
+    assert cache.get("alice") is None and cache.get("ALICE") is None
+    assert cache.get("bob") == {"Person_ID": 8}
+    cache.set("alice", row)
+    cache.invalidate("alice")
+    cache.set("Alice", row)
+    cache.invalidate_person(7)
+    assert cache.get("Alice") is None
+
+def test_login_is_served_from_identity_cache(client: FlaskClient, sqlite_db):
+    credentials = {"username": "dixonjennifer", "password": "*4J2Euc+a5"}
+    assert client.post("/login", json=credentials).status_code == 200
+    with patch.object(sqlite_db, "execute", side_effect=AssertionError("not cached")):
+        assert client.post("/login", json=credentials).status_code == 200
+
+    person_id = identity_cache.get("dixonjennifer")["Person_ID"]
+    assert client.put(f"/people/{person_id}", json={"Password": "changed"}).status_code == 200
+    assert client.post("/login", json=credentials).status_code == 401
+    assert client.post("/login", json={"username": "dixonjennifer", "password": "changed"}).status_code == 200
+
+
+# Password Hashing Tests
+def test_hasher_rehashes_plain_text_and_old_cost():
+    hasher = PasswordHasher(iterations=1000, workers=1)
+    assert hasher.verify("secret", "secret")[0]
+    ok, new_hash = hasher.verify("secret", "secret")
+    assert is_hash(new_hash) and len(new_hash) <= 100
+    assert hasher.verify("secret", new_hash) == (True, None)
+    assert hasher.verify("wrong", new_hash) == (False, None)
+    hasher.iterations = 2000
+    ok, newer_hash = hasher.verify("secret", new_hash)
+    assert ok and newer_hash.startswith("pbkdf2:sha256:2000$")
+
+def test_hasher_rejects_when_queue_is_full():
+    hasher = PasswordHasher(iterations=1000, workers=1, queue_size=0)
+    release = threading.Event()
+    busy = threading.Thread(target=hasher._run, args=(release.wait,))
+    busy.start()
+    try:
+        time.sleep(0.05)
+        with pytest.raises(HasherBusy):
+            hasher.hash("secret")
+    finally:
+        release.set()
+        busy.join()
+    assert hasher.stats()["rejected"] == 1
+
+def test_hasher_hash_many_uses_every_worker():
+    hasher = PasswordHasher(iterations=1000, workers=3, queue_size=0)
+    threads = set()
+    hash_chunk = hasher._hash_chunk
+
+    def record(passwords):
+        threads.add(threading.current_thread().name)
+        time.sleep(0.02)
+        return hash_chunk(passwords)
+
+    passwords = [f"secret{i}" for i in range(20)]
+    with patch.object(hasher, "_hash_chunk", side_effect=record):
+        hashes = hasher.hash_many(passwords, chunk_size=2)
+    assert [check_password_hash(hashed, password) for hashed, password in zip(hashes, passwords)] == [True] * 20
+    assert len(threads) == 3
+    assert hasher.stats()["jobs"] == 20
+    # Every slot was given back.
+    assert len(hasher.hash_many(passwords[:6], chunk_size=1)) == 6
+
+def test_hasher_hash_many_rejects_when_queue_is_full():
+    hasher = PasswordHasher(iterations=1000, workers=1, queue_size=0)
+    release = threading.Event()
+    busy = threading.Thread(target=hasher._run, args=(release.wait,))
+    busy.start()
+    try:
+        time.sleep(0.05)
+        with pytest.raises(HasherBusy):
+            hasher.hash_many(["secret"])
+    finally:
+        release.set()
+        busy.join()
+    assert hasher.hash_many([]) == []
+
+def test_login_rehashes_and_returns_503_when_busy(client: FlaskClient, sqlite_db):
+    credentials = {"username": "dixonjennifer", "password": "*4J2Euc+a5"}
+    assert client.post("/login", json=credentials).status_code == 200
+    with sqlite_db.session(write=False) as conn:
+        stored = conn.execute("SELECT Password FROM People WHERE Login_Name = 'dixonjennifer'").fetchone()["Password"]
+    assert is_hash(stored)
+    identity_cache.clear()
+    assert client.post("/login", json=credentials).status_code == 200
+
+    with patch('api.hasher.verify', side_effect=HasherBusy(3)):
+        response = client.post("/login", json=credentials)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+
+
+# Rate Limiting Tests
+def test_login_is_rate_limited_before_the_database(client: FlaskClient, mock_db):
+    mock_db.fetchone.return_value = None
+    capacity = app.config["RATE_LIMITS"]["login"][0]
+    for _ in range(capacity):
+        assert client.post("/login", json={"username": "x", "password": "y"}).status_code == 401
+    mock_db.reset_mock()
+    response = client.post("/login", json={"username": "x", "password": "y"})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    mock_db.execute.assert_not_called()
+    # Other route classes have their own buckets.
+    mock_db.fetchall.return_value = []
+    assert client.get("/payments").status_code == 200
+
+def test_rate_limit_keys_by_identity(client: FlaskClient, mock_db):
+    mock_db.fetchall.return_value = []
+    with patch.dict(app.config, RATE_LIMITS={"read": (2, 60)}):
+        assert client.get("/payments").status_code == 200
+        assert client.get("/payments").status_code == 200
+        assert client.get("/payments").status_code == 429
+        # An authenticated client has its own bucket.
+        assert client.get("/payments", headers=manager_headers()).status_code == 200
+
+def test_token_bucket_refills_and_sweeps():
+    backend = MemoryBackend()
+    assert backend.take("a", 1, 0.05, 0.05) == (True, 0.0)
+    allowed, retry_after = backend.take("a", 1, 0.05, 0.05)
+    assert not allowed and 0 < retry_after <= 0.05
+    time.sleep(0.06)
+    assert backend.take("b", 1, 0.05, 0.05)[0]
+    assert len(backend) == 1  # "a" was full again, so it was swept
+    assert backend.take("a", 1, 0.05, 0.05)[0]
+
+def test_sqlite_rate_limit_backend_is_shared(tmp_path):
+    path = str(tmp_path / "limits.db")
+    first, second = SQLiteBackend(path), SQLiteBackend(path)
+    assert first.take("login:ip:1.2.3.4", 2, 60, 60)[0]
+    assert second.take("login:ip:1.2.3.4", 2, 60, 60)[0]
+    assert not first.take("login:ip:1.2.3.4", 2, 60, 60)[0]
+
+
+# Bulk People Tests
+def bulk_person(login, **extra):
+    return {"Permission_Level_Code": "LOW", "Login_Name": login, "Password": "pw-" + login,
+            "Personal_Details": "Bulk", "Other_Details": "None",
+            "Country_Name": "Canada", "Role_Description": "Moderator", **extra}
+
+def test_upsert_statement_is_dialect_specific():
+    mysql = StatementRegistry(RESOURCES).upsert("people", 2).sql
+    assert mysql.count("(%s, %s, %s, %s, %s, %s, %s, %s)") == 2
+    assert mysql.endswith("Role_Description = VALUES(Role_Description)")
+    assert "Person_ID = VALUES" not in mysql
+    sqlite = StatementRegistry(SQLITE_RESOURCES, "?", "sqlite").upsert("people", 1).sql
+    assert "ON CONFLICT (Person_ID) DO UPDATE SET Permission_Level_Code = excluded.Permission_Level_Code" in sqlite
+    assert "Country_Code = excluded.Country_Code" in sqlite
+
+def test_bulk_people_creates_and_updates_in_batches(client: FlaskClient, sqlite_db):
+    # With the reference checks skipped, the second batch fails on the unknown
+    # permission level in the database and is rolled back as a whole.
+    rows = [bulk_person("bulk1"), bulk_person("renamed", Person_ID=1),
+            bulk_person("bulk2", Permission_Level_Code="ZZZ"), bulk_person("bulk3"), bulk_person("bulk4")]
+    with patch.dict(app.config, BULK_BATCH_SIZE=2), patch.object(reference_data, "person_references", return_value={}):
+        response = client.post("/people/bulk", json=rows)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body["created"], body["updated"], body["error"]) == (2, 1, 2)
+    assert [result["status"] for result in body["results"]] == ["created", "updated", "error", "error", "created"]
+    assert body["results"][3]["index"] == 3
+    assert client.get("/people?Login_Name=bulk3").get_json()["people"] == []
+
+    people = client.get("/people?Person_ID=1").get_json()["people"]
+    assert people[0]["Login_Name"] == "renamed"
+    assert people[0]["Country_Name"] == "Canada"
+    assert client.post("/login", json={"username": "bulk4", "password": "pw-bulk4"}).status_code == 200
+
+def test_bulk_people_accepts_ndjson_and_validates_everything_first(client: FlaskClient, sqlite_db):
+    lines = [json.dumps(bulk_person("nd1")), json.dumps({"Login_Name": "incomplete"}), json.dumps(bulk_person("nd2"))]
+    response = client.post("/people/bulk", data="\n".join(lines), content_type="application/x-ndjson")
+    assert response.status_code == 400
+    assert [error["index"] for error in response.get_json()["errors"]] == [1]
+    assert client.get("/people?Login_Name=nd1").get_json()["people"] == []
+
+    del lines[1]
+    response = client.post("/people/bulk", data="\n".join(lines) + "\n", content_type="application/x-ndjson")
+    assert response.get_json()["created"] == 2
+    assert client.post("/people/bulk", data="{oops", content_type="application/x-ndjson").status_code == 400
+
+def test_bulk_people_checks_references(client: FlaskClient, sqlite_db):
+    rows = [bulk_person("ref1"), bulk_person("ref2", Country_Name="Atlantis", Role_Description="Pirate")]
+    response = client.post("/people/bulk", json=rows)
+    assert response.status_code == 400
+    errors = response.get_json()["errors"]
+    assert [error["index"] for error in errors] == [1]
+    assert set(errors[0]["error"]) == {"Country_Name", "Role_Description"}
+    assert client.get("/people?Login_Name=ref1").get_json()["people"] == []
+
+def test_bulk_people_hashes_every_password(client: FlaskClient, sqlite_db):
+    made_up = "pbkdf2:sha256:1000$abcdefghijkl$" + "0" * 64
+    assert client.post("/people/bulk", json=[bulk_person("hash1", Password=made_up)]).get_json()["created"] == 1
+    # Stored as a hash of what was sent, like POST /people does.
+    assert client.post("/login", json={"username": "hash1", "password": made_up}).status_code == 200
+
+def test_bulk_people_prehashed_needs_manager(client: FlaskClient, sqlite_db):
+    hashed = PasswordHasher(iterations=1000).hash("secret")
+    rows = [bulk_person("pre1", Password=hashed)]
+    assert client.post("/people/bulk?prehashed=1", json=rows).status_code == 403
+    with app.app_context():
+        token = create_access_token(identity="manager", additional_claims={
+            "Role_Description": "Manager Role", "Permission_Level_Code": "HIGH"})
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.post("/people/bulk?prehashed=1", json=[bulk_person("pre2")], headers=headers)
+    assert response.get_json()["errors"][0]["error"] == {"Password": ["Not a password hash."]}
+    assert client.post("/people/bulk?prehashed=1", json=rows, headers=headers).get_json()["created"] == 1
+    assert client.post("/login", json={"username": "pre1", "password": "secret"}).status_code == 200
+
+
+# Streaming Ingest Tests
+def report(i, person_id=1):
+    return {"Person_ID": person_id, "Date_Report_Sent": "2024-01-01 00:00:00", "Report_Text": f"report {i}"}
+
+def count_reports(storage):
+    with storage.session(write=False) as conn:
+        return conn.execute("SELECT COUNT(*) AS n FROM Monthly_Reports").fetchone()["n"]
+
+def test_ingest_streams_ndjson_and_gzip_in_batches(client: FlaskClient, sqlite_db):
+    before = count_reports(sqlite_db)
+    body = "\n".join(json.dumps(report(i)) for i in range(5))
+    with patch.dict(app.config, INGEST_BATCH_SIZE=2, INGEST_READ_SIZE=16):
+        response = client.post("/monthly_reports", data=body, content_type="application/x-ndjson")
+        assert response.status_code == 201
+        assert (response.get_json()["inserted"], response.get_json()["batches"]) == (5, 3)
+
+        response = client.post("/monthly_reports", data=gzip.compress(json.dumps([report(5), report(6)]).encode()),
+                               content_type="application/json", headers={"Content-Encoding": "gzip"})
+        assert response.get_json()["inserted"] == 2
+    assert count_reports(sqlite_db) == before + 7
+    response = client.post("/monthly_reports", json=report(7), headers={"Content-Encoding": "br"})
+    assert response.status_code == 415
+
+def test_ingest_reports_failing_batch(client: FlaskClient, sqlite_db):
+    before = count_reports(sqlite_db)
+    rows = [report(0), report(1), report(2), report(3, person_id=99999), report(4)]
+    with patch.dict(app.config, INGEST_BATCH_SIZE=2):
+        response = client.post("/monthly_reports", json=rows)
+    assert response.status_code == 400
+    body = response.get_json()
+    assert (body["inserted"], body["failed_batch"]) == (2, 1)
+    assert count_reports(sqlite_db) == before + 2
+
+    with patch.dict(app.config, INGEST_BATCH_SIZE=2):
+        response = client.post("/monthly_reports", data='[{"Person_ID": 1, "Date_Report_Sent": "x", "Report_Text": "y"}, {"oops"',
+                               content_type="application/json")
+    assert response.get_json()["failed_batch"] == 0
+    assert count_reports(sqlite_db) == before + 2
+
+
+# Command Line Import/Export Tests
+def table_counts(storage):
+    with storage.session(write=False) as conn:
+        return {table: conn.execute(f"SELECT COUNT(*) AS n FROM {table}").fetchone()["n"]
+                for group in TABLE_GROUPS["sqlite"] for table in group}
+
+def empty_copy(source, path):
+    shutil.copy(source, path)
+    conn = sqlite3.connect(path)
+    for group in reversed(TABLE_GROUPS["sqlite"]):
+        for table in group:
+            conn.execute(f"DELETE FROM {table}")
+    conn.commit()
+    conn.close()
+    return SQLiteStorage(app, path=str(path))
+
+def test_cli_export_import_round_trip(sqlite_db, tmp_path):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["cms", "export", "--dir", str(tmp_path / "out")])
+    assert result.exit_code == 0, result.output
+    assert "total" in result.output
+    with open(tmp_path / "out" / "payments.csv") as f:
+        assert "\\N" in f.read()
+
+    target = empty_copy("CustomerManagementSystem.db", tmp_path / "empty.db")
+    with patch('api.db', target):
+        result = runner.invoke(args=["cms", "import", "--dir", str(tmp_path / "out"), "--batch-size", "10",
+                                     "--workers", "4"])
+    assert result.exit_code == 0, result.output
+    assert "importing with 1 worker" in result.output
+    assert table_counts(target) == table_counts(sqlite_db)
+    with target.session(write=False) as conn:
+        row = conn.execute("SELECT * FROM Payments WHERE Date_Paid IS NULL LIMIT 1").fetchone()
+    assert row is not None
+
+def test_cli_ndjson_round_trip_and_replace(sqlite_db, tmp_path):
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["cms", "export", "Payments", "--dir", str(tmp_path), "--format", "ndjson"])
+    assert result.exit_code == 0, result.output
+    assert not (tmp_path / "people.ndjson").exists()
+
+    result = runner.invoke(args=["cms", "import", "payments", "--dir", str(tmp_path), "--format", "ndjson"])
+    assert result.exit_code == 1
+    assert "UNIQUE constraint failed" in result.output
+    result = runner.invoke(args=["cms", "import", "payments", "--dir", str(tmp_path), "--format", "ndjson",
+                                 "--replace"])
+    assert result.exit_code == 0, result.output
+    assert table_counts(sqlite_db)["Payments"] == 75
+
+    result = runner.invoke(args=["cms", "export", "nope", "--dir", str(tmp_path)])
+    assert result.exit_code == 2
+
+
+# CSV Export Tests
+def test_csv_export_streams_filtered_projection(client: FlaskClient, sqlite_db):
+    with patch.dict(app.config, STREAM_CHUNK_SIZE=2):
+        response = client.get("/payments?format=csv&Person_ID=4&fields=Amount_Due,Date_Paid")
+    assert response.status_code == 200
+    assert response.mimetype == "text/csv"
+    assert response.is_streamed
+    assert 'filename="payments.csv"' in response.headers["Content-Disposition"]
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == ["Payment_ID", "Amount_Due", "Date_Paid"]
+    assert len(rows) > 1
+    assert "" in [row[2] for row in rows[1:]]
+
+def test_csv_export_by_accept_header(client: FlaskClient, sqlite_db):
+    response = client.get("/people?fields=Login_Name", headers={"Accept": "text/csv"})
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0] == ["Person_ID", "Login_Name"]
+    assert len(rows) == 76
+    response = client.get("/people?format=json", headers={"Accept": "text/csv"})
+    assert response.mimetype == "application/json"
+
+def test_csv_values_are_formatted_consistently():
+    assert csv_value(decimal.Decimal("41.10")) == decimal.Decimal("41.10")
+    assert str(csv_value(decimal.Decimal("41.10"))) == "41.10"
+    assert csv_value(datetime.datetime(2024, 4, 20, 6, 15, 3)) == "2024-04-20 06:15:03"
+    assert csv_value(datetime.date(2024, 4, 20)) == "2024-04-20"
+    assert csv_value(None) == ""
+
+
+# Columnar Shape Tests
+def test_columnar_page_keeps_cursor(client: FlaskClient, sqlite_db):
+    response = client.get("/payments?shape=columnar&limit=2&fields=Amount_Due")
+    assert response.status_code == 200
+    assert response.mimetype == "application/vnd.cms.columnar+json"
+    body = response.get_json()
+    assert body["columns"] == ["Payment_ID", "Amount_Due"]
+    assert [row[0] for row in body["rows"]] == [1, 2]
+
+    response = client.get("/payments?shape=columnar&limit=2&fields=Amount_Due&after=" + response.headers["X-Next-Cursor"])
+    assert [row[0] for row in response.get_json()["rows"]] == [3, 4]
+    plain = client.get("/payments?limit=4").get_json()
+    assert [p["Amount_Due"] for p in plain[2:]] == [row[1] for row in response.get_json()["rows"]]
+
+def test_columnar_column_arrays_and_accept_header(client: FlaskClient, sqlite_db):
+    response = client.get("/people?orient=columns&limit=3&fields=Login_Name",
+                          headers={"Accept": "application/vnd.cms.columnar+json"})
+    body = response.get_json()
+    assert body["columns"] == ["Person_ID", "Login_Name"]
+    assert body["data"][0] == [1, 2, 3]
+    assert len(body["data"][1]) == 3
+    response = client.get("/payments?shape=columnar&orient=columns&stream=1")
+    assert response.status_code == 400
+
+def test_columnar_stream(client: FlaskClient, sqlite_db):
+    with patch.dict(app.config, STREAM_CHUNK_SIZE=10):
+        body = client.get("/internal_messages?shape=columnar&stream=1").get_json()
+        lines = client.get("/internal_messages?shape=columnar&stream=ndjson").get_data(as_text=True).splitlines()
+    assert body["columns"][0] == "Message_ID"
+    assert len(body["rows"]) == 75
+    assert json.loads(lines[0]) == body["columns"]
+    assert [json.loads(line) for line in lines[1:]] == body["rows"]
+
+
+# Response Compression Tests
+def test_large_responses_are_compressed(client: FlaskClient, sqlite_db):
+    plain = client.get("/internal_messages?limit=50")
+    assert "Content-Encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    response = client.get("/internal_messages?limit=50", headers={"Accept-Encoding": "gzip, deflate"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(response.data) < len(plain.data)
+    assert gzip.decompress(response.data) == plain.data
+
+    response = client.get("/internal_messages?limit=50", headers={"Accept-Encoding": "deflate, gzip;q=0.5"})
+    assert response.headers["Content-Encoding"] == "deflate"
+    assert zlib.decompress(response.data) == plain.data
+
+def test_small_responses_are_not_compressed(client: FlaskClient, sqlite_db):
+    response = client.get("/payments?limit=1", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+
+def test_streams_are_compressed_incrementally(client: FlaskClient, sqlite_db):
+    with patch.dict(app.config, STREAM_CHUNK_SIZE=10):
+        plain = client.get("/payments?stream=ndjson").data
+        response = client.get("/payments?stream=ndjson", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Content-Length" not in response.headers
+        chunks = list(response.response)
+    # One flushed block per fetched chunk, each decodable as it arrives.
+    assert len(chunks) >= 8
+    decompressor = zlib.decompressobj(31)
+    first = decompressor.decompress(chunks[0])
+    assert first and plain.startswith(first)
+    assert first + b"".join(decompressor.decompress(chunk) for chunk in chunks[1:]) == plain
+
+
+# Conditional GET Tests
+def test_unchanged_poll_gets_304_without_sql(client: FlaskClient, mock_db):
+    mock_db.fetchall.return_value = [{"Payment_ID": 1, "Amount_Due": 100.0}]
+    response = client.get("/payments?limit=10")
+    etag = response.headers["ETag"]
+    assert "Accept" in response.headers["Vary"]
+
+    mock_db.execute.reset_mock()
+    response = client.get("/payments?limit=10", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    mock_db.execute.assert_not_called()
+
+    # Other arguments or another representation are different entities.
+    assert client.get("/payments?limit=5", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/payments?limit=10", headers={"If-None-Match": etag,
+                                                       "Accept": "text/csv"}).status_code == 200
+
+def test_writes_bump_the_table_version(client: FlaskClient, sqlite_db):
+    etag = client.get("/people?limit=5").headers["ETag"]
+    other = client.get("/payments?limit=5").headers["ETag"]
+    assert client.put("/people/1", json={"Country_Name": "India"}).status_code == 200
+    response = client.get("/people?limit=5", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.get_json()["people"][0]["Country_Name"] == "India"
+    assert client.get("/payments?limit=5", headers={"If-None-Match": other}).status_code == 304
+
+def test_compressed_etag_revalidates(client: FlaskClient, sqlite_db):
+    response = client.get("/internal_messages?limit=50", headers={"Accept-Encoding": "gzip"})
+    etag = response.headers["ETag"]
+    assert etag.endswith('-gzip"')
+    response = client.get("/internal_messages?limit=50", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+def test_no_etag_while_replicas_may_lag(replicated_db):
+    table_versions.reset()
+    client = app.test_client()
+    assert "ETag" in client.get("/people?limit=5").headers
+    assert client.put("/people/1", json={"Country_Name": "India"}).status_code == 200
+    # A fresh client reads from the replica, which may not have the change yet.
+    assert "ETag" not in app.test_client().get("/people?limit=5").headers
+
+def test_sqlite_versions_are_shared(tmp_path):
+    first, second = SQLiteVersions(str(tmp_path / "v.db")), SQLiteVersions(str(tmp_path / "v.db"))
+    assert first.epoch == second.epoch
+    first.bump("payments")
+    first.bump("payments")
+    assert second.get("payments")[0] == 2
+    assert second.snapshot() == {"payments": 2}
+    epoch = first.epoch
+    second.reset()
+    assert first.get("payments") == (0, 0.0)
+    assert first.epoch != epoch
+
+
+# Reference Data Tests
+def test_permission_levels_served_from_snapshot(client: FlaskClient, sqlite_db):
+    first = client.get("/permission_levels")
+    assert first.get_json() == client.get("/permission_levels?limit=100").get_json()
+    with patch.object(sqlite_db, "cursor", side_effect=AssertionError("queried")):
+        response = client.get("/permission_levels")
+        assert response.data == first.data
+        # Duplicate check without a SELECT
+        response = client.post("/permission_levels", json={"Permission_Level_Code": "LOW",
+                                                           "Permission_Level_Description": "Low"})
+        assert response.status_code == 400
+
+def test_permission_level_insert_swaps_snapshot(client: FlaskClient, sqlite_db):
+    client.get("/permission_levels")
+    loads = reference_data.stats()["loads"]
+    response = client.post("/permission_levels", json={"Permission_Level_Code": "TOP",
+                                                       "Permission_Level_Description": "Top"})
+    assert response.status_code == 201
+    with patch.object(sqlite_db, "cursor", side_effect=AssertionError("queried")):
+        codes = [level["Permission_Level_Code"] for level in client.get("/permission_levels").get_json()]
+    assert "TOP" in codes
+    assert client.get("/permission_levels").data == client.get("/permission_levels?limit=100").data
+    assert reference_data.stats()["loads"] == loads
+
+def test_add_person_checks_references_in_memory(client: FlaskClient, sqlite_db):
+    person = {"Permission_Level_Code": "LOW", "Login_Name": "refuser", "Password": "password123",
+              "Personal_Details": "Test", "Other_Details": "None", "Country_Name": "Atlantis",
+              "Role_Description": "User"}
+    response = client.post("/people", json=person)
+    assert response.status_code == 400
+    assert "Unknown Country_Name" in response.get_json()["error"]
+    response = client.post("/people", json={**person, "Country_Name": "India", "Permission_Level_Code": "XXX"})
+    assert "Unknown Permission_Level_Code" in response.get_json()["error"]
+    assert client.post("/people", json={**person, "Country_Name": "India"}).status_code == 201
+
+# JSON Encoding Tests
+def test_row_encoder_matches_json(client: FlaskClient):
+    rows = [{"Payment_ID": 1, "Amount_Due": decimal.Decimal("10.50"), "Date_Paid": datetime.datetime(2024, 1, 2, 3, 4, 5),
+             "Note": 'say "hi"', "Paid": True},
+            {"Payment_ID": 2, "Amount_Due": None, "Date_Paid": datetime.date(2024, 1, 3), "Note": "ünï", "Paid": False}]
+    body = app.json.dumps_rows(rows, "\n")
+    assert [json.loads(line) for line in body.split("\n")] == [
+        {"Payment_ID": 1, "Amount_Due": "10.50", "Date_Paid": "2024-01-02 03:04:05", "Note": 'say "hi"', "Paid": True},
+        {"Payment_ID": 2, "Amount_Due": None, "Date_Paid": "2024-01-03", "Note": "ünï", "Paid": False}]
+
+def test_row_encoder_falls_back_on_other_types(client: FlaskClient):
+    rows = [(1, "a"), (None, 2), ("x", [1, 2])]
+    assert json.loads("[" + app.json.dumps_rows(rows) + "]") == [[1, "a"], [None, 2], ["x", [1, 2]]]
+
+def test_row_encoder_keeps_time_of_a_datetime_in_a_date_column(client: FlaskClient):
+    provider = RowJSONProvider(app)
+    rows = [{"Sent": datetime.date(2024, 1, 2)}, {"Sent": datetime.datetime(2024, 1, 3, 4, 5, 6)}]
+    assert provider.encode_rows(rows) == ['{"Sent":"2024-01-02"}', '{"Sent":"2024-01-03 04:05:06"}']
+
+def test_tuple_row_encoders_are_kept_per_cursor_description(client: FlaskClient):
+    provider = RowJSONProvider(app)
+    dates = [(1, datetime.date(2024, 1, 2))]
+    times = [(1, datetime.datetime(2024, 1, 3, 4, 5, 6))]
+    assert provider.dumps_rows(dates, description=[("Report_ID", 3), ("Sent", 10)]) == '[1,"2024-01-02"]'
+    assert provider.dumps_rows(times, description=[("Payment_ID", 3), ("Date_Paid", 12)]) == '[1,"2024-01-03 04:05:06"]'
+    assert provider.dumps_rows(dates) == '[1,"2024-01-02"]'
+    assert provider.dumps_rows(times) == '[1,"2024-01-03 04:05:06"]'
+    assert len(provider._encoders) == 4
+
+def test_payments_page_encodes_decimal_and_datetime(client: FlaskClient, mock_db):
+    mock_db.fetchall.return_value = [{"Payment_ID": 1, "Amount_Due": decimal.Decimal("99.90"),
+                                      "Date_Paid": datetime.datetime(2024, 5, 6, 7, 8, 9)}]
+    response = client.get("/payments?limit=1")
+    assert response.status_code == 200
+    assert response.get_json()[0] == {"Payment_ID": 1, "Amount_Due": "99.90", "Date_Paid": "2024-05-06 07:08:09"}
+
+
+# Row Fragment Cache Tests
+def test_list_pages_reuse_row_fragments(client: FlaskClient, sqlite_db):
+    first = client.get("/payments?limit=10")
+    hits = row_fragments.stats()["hits"]
+    second = client.get("/payments?limit=10")
+    assert second.data == first.data
+    assert row_fragments.stats()["hits"] == hits + 10
+    assert row_fragments.stats()["bytes"] > 0
+    with patch.dict(app.config, ROW_FRAGMENT_TABLES=()):
+        assert client.get("/payments?limit=10").get_json() == first.get_json()
+    assert first.headers["X-Next-Cursor"] == second.headers["X-Next-Cursor"]
+
+def test_row_fragments_skip_projections(client: FlaskClient, sqlite_db):
+    client.get("/payments?fields=Amount_Due")
+    assert row_fragments.stats()["size"] == 0
+
+def test_insert_keeps_fragments_and_delete_drops_them(client: FlaskClient, sqlite_db):
+    client.get("/internal_messages")
+    message = {"msg_from_person_id": 1, "msg_to_person_id": 2, "date_message_sent": "2024-01-01 10:00:00",
+               "message_subject": "Hi", "message_text": "Hello"}
+    assert client.post("/internal_messages", json=message).status_code == 201
+    misses = row_fragments.stats()["misses"]
+    ids = [row["Message_ID"] for row in client.get("/internal_messages?limit=1000").get_json()]
+    assert row_fragments.stats()["misses"] == misses + 1  # only the new message
+    assert client.delete(f"/internal_messages/{ids[0]}").status_code == 200
+    misses = row_fragments.stats()["misses"]
+    assert ids[0] not in [row["Message_ID"] for row in client.get("/internal_messages?limit=1000").get_json()]
+    # Only the deleted row's version moved; the other 75 fragments are still used.
+    assert row_fragments.stats()["misses"] == misses
+
+def test_row_versions_are_per_row(tmp_path):
+    versions = SQLiteVersions(str(tmp_path / "versions.db"))
+    versions.bump_row("payments", 7)
+    versions.bump_row("payments", 7)
+    versions.bump_row("payments", 8)
+    assert {pk: version for pk, (version, _) in versions.get_rows("payments", [7, 8, 9]).items()} == {7: 2, 8: 1}
+    assert versions.get_rows("monthly_reports", [7]) == {}
+    versions.reset()
+    assert versions.get_rows("payments", [7]) == {}
+
+
+# Single Row Tests
+def test_get_row_by_id_is_cached(client: FlaskClient, sqlite_db):
+    response = client.get("/payments/2")
+    assert response.status_code == 200
+    assert response.get_json() == client.get("/payments?limit=2").get_json()[1]
+    with patch.object(sqlite_db, "execute", side_effect=AssertionError("queried")):
+        assert client.get("/payments/2").data == response.data
+    assert row_cache.stats()["hits"] == 1
+
+def test_get_row_not_found_is_cached_until_insert(client: FlaskClient, sqlite_db):
+    assert client.get("/internal_messages/76").status_code == 404
+    with patch.object(sqlite_db, "execute", side_effect=AssertionError("queried")):
+        response = client.get("/internal_messages/76")
+    assert response.status_code == 404
+    assert response.get_json() == {"error": "Internal message not found"}
+    message = {"msg_from_person_id": 1, "msg_to_person_id": 2, "date_message_sent": "2024-01-01 10:00:00",
+               "message_subject": "Hi", "message_text": "Hello"}
+    assert client.post("/internal_messages", json=message).status_code == 201
+    assert client.get("/internal_messages/76").get_json()["Message_Subject"] == "Hi"
+    assert row_cache.stats()["negative_hits"] == 1
+
+def test_row_read_before_a_write_is_not_cached(client: FlaskClient, sqlite_db):
+    execute = sqlite_db.execute
+
+    def execute_then_write(*args, **kwargs):
+        cur = execute(*args, **kwargs)
+        # A PUT commits and drops the row after the GET has read it, before the GET caches it.
+        row_cache.invalidate(("payments", 2))
+        return cur
+
+    with patch.object(sqlite_db, "execute", side_effect=execute_then_write):
+        assert client.get("/payments/2").status_code == 200
+    assert len(row_cache) == 0
+    client.get("/payments/2")
+    assert len(row_cache) == 1
+
+def test_writes_drop_cached_rows(client: FlaskClient, sqlite_db):
+    client.get("/people/1")
+    assert client.put("/people/1", json={"Other_Details": "Changed"}).status_code == 200
+    assert client.get("/people/1").get_json()["Other_Details"] == "Changed"
+    client.get("/monthly_reports/1")
+    assert client.delete("/monthly_reports/1").status_code == 200
+    assert client.get("/monthly_reports/1").status_code == 404
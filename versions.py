@@ -0,0 +1,172 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+class MemoryVersions:
+    """Change counters for one process.
+
+    Counters start again at 0 when the process restarts, so ETags also carry
+    an epoch that is new for every process.
+    """
+
+    def __init__(self):
+        self.epoch = os.urandom(8).hex()
+        self._versions = {}
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        return self._versions.get(name, (0, 0.0))
+
+    def bump(self, name):
+        with self._lock:
+            version, _ = self._versions.get(name, (0, 0.0))
+            self._versions[name] = (version + 1, time.time())
+
+    def get_rows(self, name, pks):
+        rows = self._rows.get(name, {})
+        return {pk: rows[pk] for pk in pks if pk in rows}
+
+    def bump_row(self, name, pk):
+        with self._lock:
+            rows = self._rows.setdefault(name, {})
+            version, _ = rows.get(pk, (0, 0.0))
+            rows[pk] = (version + 1, time.time())
+
+    def snapshot(self):
+        return {name: version for name, (version, _) in self._versions.items()}
+
+    def reset(self):
+        # A new epoch, so tags handed out before the reset never match again.
+        with self._lock:
+            self._versions.clear()
+            self._rows.clear()
+            self.epoch = os.urandom(8).hex()
+
+
+class SQLiteVersions:
+    """Change counters in a SQLite file, shared by every worker process on a host."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS table_versions "
+                     "(name TEXT PRIMARY KEY, version INTEGER NOT NULL, changed_at REAL NOT NULL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS row_versions (name TEXT NOT NULL, pk NOT NULL, "
+                     "version INTEGER NOT NULL, changed_at REAL NOT NULL, PRIMARY KEY (name, pk))")
+        # The epoch row is written once, so every process sharing the file agrees on it.
+        conn.execute("INSERT OR IGNORE INTO table_versions VALUES ('', ?, 0)", (int.from_bytes(os.urandom(6), "big"),))
+
+    @property
+    def epoch(self):
+        return format(self.get("")[0], "x")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")
+        return conn
+
+    def get(self, name):
+        row = self._connection().execute(
+            "SELECT version, changed_at FROM table_versions WHERE name = ?", (name,)).fetchone()
+        return row or (0, 0.0)
+
+    def bump(self, name):
+        self._connection().execute(
+            "INSERT INTO table_versions VALUES (?, 1, ?) "
+            "ON CONFLICT (name) DO UPDATE SET version = version + 1, changed_at = excluded.changed_at",
+            (name, time.time()))
+
+    def get_rows(self, name, pks):
+        pks = list(pks)
+        if not pks:
+            return {}
+        rows = self._connection().execute(
+            f"SELECT pk, version, changed_at FROM row_versions WHERE name = ? AND pk IN ({', '.join('?' * len(pks))})",
+            [name, *pks])
+        return {pk: (version, changed_at) for pk, version, changed_at in rows}
+
+    def bump_row(self, name, pk):
+        self._connection().execute(
+            "INSERT INTO row_versions VALUES (?, ?, 1, ?) "
+            "ON CONFLICT (name, pk) DO UPDATE SET version = version + 1, changed_at = excluded.changed_at",
+            (name, pk, time.time()))
+
+    def snapshot(self):
+        return dict(self._connection().execute("SELECT name, version FROM table_versions WHERE name != ''"))
+
+    def reset(self):
+        conn = self._connection()
+        conn.execute("DELETE FROM table_versions WHERE name != ''")
+        conn.execute("DELETE FROM row_versions")
+        conn.execute("UPDATE table_versions SET version = ? WHERE name = ''", (int.from_bytes(os.urandom(6), "big"),))
+
+
+class TableVersions:
+    """A monotonic change counter per table, the basis of the list endpoints' ETags.
+
+    Every write handler bumps its table after committing. A GET reads the
+    counter before it queries, so a response is never tagged with a newer
+    version than the data it holds.
+
+    Rows can carry versions of their own too, for caches of single rows
+    (see fragments.py); those are bumped per primary key.
+
+    TABLE_VERSION_STORAGE is ``memory`` (per process) or ``sqlite:///path``
+    to share the counters between the worker processes on one host; with
+    per-process counters, a write served by another process is not seen.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("TABLE_VERSION_STORAGE", "memory")
+        storage = app.config["TABLE_VERSION_STORAGE"]
+        if storage.startswith("sqlite:///"):
+            self.backend = SQLiteVersions(storage[len("sqlite:///"):])
+        else:
+            self.backend = MemoryVersions()
+
+    def get(self, name):
+        """``(version, changed_at)`` of ``name``; changed_at is a Unix time."""
+        return self.backend.get(name)
+
+    def bump(self, name):
+        self.backend.bump(name)
+
+    @property
+    def epoch(self):
+        return self.backend.epoch
+
+    def get_rows(self, name, pks):
+        """``{pk: (version, changed_at)}`` for the rows of ``name`` among ``pks`` ever bumped; others are at 0."""
+        return self.backend.get_rows(name, pks)
+
+    def bump_row(self, name, pk):
+        """Move one row's version, after a handler updated or deleted it."""
+        self.backend.bump_row(name, pk)
+
+    def stamp(self, name):
+        """``(epoch, version)``: equal stamps mean ``name`` has not been written in between."""
+        return self.backend.epoch, self.backend.get(name)[0]
+
+    def etag(self, name, version, *parts):
+        """Strong ETag for ``name`` at ``version``, varying with ``parts`` (path, arguments, ...)."""
+        key = "\0".join([self.backend.epoch, name, str(version), *parts])
+        return hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+    def reset(self):
+        self.backend.reset()
+
+    def stats(self):
+        return self.backend.snapshot()